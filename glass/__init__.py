@@ -1,9 +1,16 @@
 from ._helpers import current_app
 from .app import GlassApp
+from .blueprints import Blueprint
 from .requests import request
-from .response import Response, flash, get_session_messages, redirect
+from .response import (
+    Response,
+    StreamingResponse,
+    flash,
+    get_session_messages,
+    redirect,
+)
 from .sessions import session
-from .templating import render_string, render_template
+from .templating import render_string, render_template, stream_template
 
 from .routing import url_for
 
@@ -1,25 +1,28 @@
-import threading
-
-from .utils import _thread_local
+import contextvars
 
 
 class AppStack:
+    """Stack of mounted apps, local to the thread or
+    asyncio task. The stack is stored as tuple so a copied
+    context never shares it.
+    """
+
     def __init__(self):
-        self.local = threading.local()
+        self.local = contextvars.ContextVar("glass.app_stack", default=())
 
     def push(self, obj):
-        if not hasattr(self.local, "stack"):
-            self.local.stack = []
-        self.local.stack.append(obj)
+        self.local.set(self.local.get() + (obj,))
 
     def pop(self):
-        return self.local.stack.pop()
+        stack = self.local.get()
+        self.local.set(stack[:-1])
+        return stack[-1]
 
     def top(self):
-        try:
-            return self.local.stack[-1]
-        except (AttributeError, IndexError):
-            return None
+        stack = self.local.get()
+        if stack:
+            return stack[-1]
+        return None
 
     def __enter__(self):
         return self
@@ -67,12 +70,19 @@ def flash(message, category=None):
     if not flashes:
         flashes = _session.session["__flash__"] = []
     flashes.append(message)
+    _session.session.modified = True
 
 
 def messages():
     # This is depreciated.
     import glass.sessions as _session
 
+    taken = _session.session.flashes
+    if taken is not None:
+        # taken out of the session by StreamingResponse
+        _session.session.flashes = None
+        yield from taken
+        return
     msgs = _session.session.get("__flash__", None)
     if msgs is None:
         return
@@ -1,12 +1,23 @@
+import inspect
 import logging
 import os
+import threading
 
+from glass import asgi
 from glass.config import Config
 from glass.exception import HTTPError, InternalServerError
 from glass.requests import request
-from glass.response import JsonResponse, Redirect, Response, send_static
-from glass.routing import Router, Rule
-from glass.sessions import SessionManager
+from glass.response import (
+    BaseResponse,
+    JsonResponse,
+    Redirect,
+    Response,
+    StaticFiles,
+    StreamingResponse,
+    send_static,
+)
+from glass.routing import OptionsRule, Router, Rule
+from glass.sessions import SessionManager, session
 from glass.templating import (
     AppTemplateEnviron,
     AppTemplateLoader,
@@ -45,13 +56,17 @@ class GlassApp:
 
         self.session_cls = SessionManager()
         self.config = Config()
-        self.router = Router()
+        self.router = Router(self)
         self.error_code_handlers = {}
         self.error_handlers = {}
         self.before_request_funcs = []
         self.after_request_funcs = []
         self.url_rules = []
         self.view_func = {}
+        self.blueprints = {}
+        self.frozen = False
+        self._freeze_lock = threading.Lock()
+        self._pipeline = None
         static_url = self.config["STATIC_URL"] or "static"
         static_url = static_url.strip("/")
         self.add_url_rule(
@@ -79,6 +94,11 @@ class GlassApp:
     def send_static(self, filename):
         return send_static(filename, self, request)
 
+    @cached_property()
+    def static_files(self):
+        """:class:`~glass.response.StaticFiles` metadata cache"""
+        return StaticFiles(self)
+
     @cached_property()
     def template_cache(self):
         return Cache()
@@ -90,6 +110,18 @@ class GlassApp:
            @app.route('/')
            def index():
               return 'Hello'
+
+        Pass ``host`` to bind the rule to a host or to a subdomain
+        pattern, the subdomain is passed to the view.
+        ::
+
+           @app.route('/', host='api.example.com')
+           def api_index():
+              return 'api'
+
+           @app.route('/', host='<tenant>.example.com')
+           def tenant_index(tenant):
+              return tenant
         """
 
         def decorator(func):
@@ -98,7 +130,9 @@ class GlassApp:
 
         return decorator
 
-    def _add_rule(self, url_rule, func, methods, view_name=None, **kwargs):
+    def _add_rule(
+        self, url_rule, func, methods, view_name=None, blueprint=None, **kwargs
+    ):
 
         if not methods:
             methods = ["GET"]
@@ -106,12 +140,34 @@ class GlassApp:
             methods = [methods]
         methods = list(map(str.upper, methods))
         rule = Rule(url_rule, func, methods, **kwargs)
-        self.router.add(rule)
-        self.url_rules.append(rule)
+        rule.blueprint = blueprint
         if not view_name:
             view_name = func.__name__
+        if blueprint is None:
+            self.router.add(rule)
+        else:
+            blueprint.router.add(rule)
+            view_name = "%s.%s" % (blueprint.name, view_name)
+        self.url_rules.append(rule)
         self.view_func[view_name] = rule
 
+    def register_blueprint(self, blueprint, url_prefix=None):
+        """Mount :class:`~glass.blueprints.Blueprint` on the app.
+        Requests under the blueprint url prefix are matched with the
+        blueprint routes first.
+
+        :param url_prefix: overrides the blueprint ``url_prefix``
+        """
+        if self.frozen:
+            raise RuntimeError(
+                "Can't register blueprint %s, the app is frozen" % blueprint.name
+            )
+        if blueprint.name in self.blueprints:
+            raise ValueError("Blueprint %s is already registered" % blueprint.name)
+        blueprint.register(self, url_prefix)
+        self.blueprints[blueprint.name] = blueprint
+        self._reset_pipeline()
+
     def add_url_rule(self, rule, func, methods=None, view_name=None):
         return self.route(rule, methods, view_name)(func)
 
@@ -156,6 +212,7 @@ class GlassApp:
 
         """
         self.before_request_funcs.append(func)
+        self._reset_pipeline()
         return func
 
     def after_request(self, func):
@@ -181,6 +238,7 @@ class GlassApp:
 
         """
         self.after_request_funcs.append(func)
+        self._reset_pipeline()
         return func
 
     def error(self, error):
@@ -207,6 +265,7 @@ class GlassApp:
                 self.error_code_handlers[error] = func
             else:
                 self.error_handlers[error] = func
+            self._reset_pipeline()
             return func
 
         return decorator
@@ -217,6 +276,32 @@ class GlassApp:
     def use_converter(self, converter):
         self.router.use_converter(converter)
 
+    def freeze(self, strict=False):
+        """Validate the routes, build the route matcher and make the
+        route table immutable. Adding routes after this raises
+        ``RuntimeError``.
+
+        This is called on the first request and by :meth:`run`,
+        call it after registering all the routes to find
+        route problems at startup.
+
+        Rules registered twice for the same method and rules
+        shadowed by another rule are logged as warning.
+
+        :param strict: raise ``ValueError`` if there is any route problem.
+        """
+        with self._freeze_lock:
+            if self.frozen:
+                return
+            problems = self.router.validate()
+            for problem in problems:
+                logger.warning(problem)
+            if strict and problems:
+                raise ValueError("\n".join(problems))
+            self.router.freeze()
+            self._build_pipeline()
+            self.frozen = True
+
     def run(self, host="127.0.0.1", port=8000, debug=None, auto_reload=False):
         """Run the application development server.
 
@@ -239,6 +324,7 @@ class GlassApp:
             return
         if debug is not None:
             self.config["DEBUG"] = bool(debug)
+        self.freeze()
         from glass.server import GlassServer
 
         GlassServer().run_app(self, host, port, auto_reload)
@@ -249,64 +335,137 @@ class GlassApp:
         app_stack.push(self)
         if environ is not None:
             request.bind(environ)
-            self.session_cls.open()
+            session.open_lazy(self.session_cls)
         return app_stack
 
-    def _call_before_request(self):
-        for func in self.before_request_funcs:
-            response = func()
-            if response:
-                return response
-        return None
+    def _before_request_funcs(self, blueprint=None):
+        funcs = self.before_request_funcs
+        if blueprint is not None and blueprint.before_request_funcs:
+            funcs = funcs + blueprint.before_request_funcs
+        return funcs
+
+    def _after_request_funcs(self, blueprint=None):
+        funcs = self.after_request_funcs
+        if blueprint is not None and blueprint.after_request_funcs:
+            funcs = blueprint.after_request_funcs + funcs
+        return funcs
+
+    def _check_after_request(self, response, return_value):
+        if not isinstance(return_value, response.__class__):
+            raise TypeError(
+                "after_request function should return %s not %s"
+                % (response.__class__, return_value.__class__)
+            )
 
-    def _call_after_request(self, response):
-        return_value = None
-        for func in self.after_request_funcs:
-            return_value = func(response)
-            if not isinstance(return_value, response.__class__):
-                raise TypeError(
-                    "after_request function should return %s not %s"
-                    % (response.__class__, return_value.__class__)
-                )
-        if not return_value:
-            return response
-        return return_value
+    def _reset_pipeline(self):
+        self._pipeline = None
 
-    def _call_callback(self, environ):
-        try:
-            rule, kwargs = self.router.match(environ)
-            method = environ.get("REQUEST_METHOD", "GET")
-            if rule.url_rule.endswith("/"):
-                if not environ["PATH_INFO"].endswith("/"):
-                    return Redirect(environ["PATH_INFO"] + "/", status_code=307)
-            callback = rule.get_callback(method)
-            response = self._call_before_request()
-            if not response:
-                response = callback(**kwargs)
-        except HTTPError as exc:
-            response = self._handle_http_exc(exc)
-        except Exception as exc:
-            response = self._handle_app_exc(exc)
-        response = self._build_response(response)
-        return self._call_after_request(response)
+    def _build_pipeline(self):
+        """Compile the hooks, error handlers and response builder into one
+        ``pipeline(environ)`` function returning the response.
+        Built on :meth:`freeze`, hooks, error handlers and blueprints
+        added later reset it and it is built again on the next request.
+        """
+        hooks = {
+            None: (
+                tuple(self._before_request_funcs()),
+                tuple(self._after_request_funcs()),
+            )
+        }
+        for blueprint in self.blueprints.values():
+            hooks[blueprint] = (
+                tuple(self._before_request_funcs(blueprint)),
+                tuple(self._after_request_funcs(blueprint)),
+            )
+        match = self.router.match
+        build_response = self._build_response
+        handle_http_exc = self._handle_http_exc
+        handle_app_exc = self._handle_app_exc
+        check_after_request = self._check_after_request
+
+        if not any(before or after for before, after in hooks.values()):
+
+            def pipeline(environ):
+                blueprint = None
+                try:
+                    rule, kwargs = match(environ)
+                    blueprint = rule.blueprint
+                    if rule.url_rule.endswith("/"):
+                        if not environ["PATH_INFO"].endswith("/"):
+                            return Redirect(environ["PATH_INFO"] + "/", status_code=307)
+                    if rule.__class__ is OptionsRule:
+                        return Response("", headers={"Allow": rule.allow})
+                    response = rule.callback(**kwargs)
+                except HTTPError as exc:
+                    response = handle_http_exc(exc, blueprint)
+                except Exception as exc:
+                    response = handle_app_exc(exc, blueprint)
+                if response.__class__ is str:
+                    return Response(response)
+                return build_response(response)
 
-    def _handle_app_exc(self, exc):
+        else:
+            no_hooks = hooks[None]
+
+            def pipeline(environ):
+                blueprint = None
+                try:
+                    rule, kwargs = match(environ)
+                    blueprint = rule.blueprint
+                    if rule.url_rule.endswith("/"):
+                        if not environ["PATH_INFO"].endswith("/"):
+                            return Redirect(environ["PATH_INFO"] + "/", status_code=307)
+                    if rule.__class__ is OptionsRule:
+                        # OPTIONS without a view, answered with the
+                        # precomputed Allow header.
+                        response = Response("", headers={"Allow": rule.allow})
+                    else:
+                        response = None
+                        for func in hooks.get(blueprint, no_hooks)[0]:
+                            response = func()
+                            if response:
+                                break
+                        if not response:
+                            response = rule.callback(**kwargs)
+                except HTTPError as exc:
+                    response = handle_http_exc(exc, blueprint)
+                except Exception as exc:
+                    response = handle_app_exc(exc, blueprint)
+                response = build_response(response)
+                return_value = None
+                for func in hooks.get(blueprint, no_hooks)[1]:
+                    return_value = func(response)
+                    check_after_request(response, return_value)
+                return return_value or response
+
+        self._pipeline = pipeline
+        return pipeline
+
+    def _get_error_handler(self, exc, blueprint=None):
+        if hasattr(exc, "code"):
+            code = exc.code
+            if blueprint is not None and code in blueprint.error_code_handlers:
+                return blueprint.error_code_handlers[code]
+            return self.error_code_handlers.get(code)
+        cls = exc.__class__
+        if blueprint is not None and cls in blueprint.error_handlers:
+            return blueprint.error_handlers[cls]
+        return self.error_handlers.get(cls)
+
+    def _handle_app_exc(self, exc, blueprint=None):
         if not self.config["DEBUG"]:
-            if hasattr(exc, "code"):
-                handler = self.error_code_handlers.get(exc.code)
-            else:
-                handler = self.error_handlers.get(exc.__class__)
+            handler = self._get_error_handler(exc, blueprint)
             if handler:
                 self.log_exception(exc)
                 return handler(exc)
         exc = InternalServerError(code=500)
-        return self._handle_http_exc(exc)
+        return self._handle_http_exc(exc, blueprint)
 
-    def _handle_http_exc(self, exc):
+    def _handle_http_exc(self, exc, blueprint=None):
         self.log_exception(exc)
         debug = self.config["DEBUG"]
         if not debug:
-            error_handler = self.error_code_handlers.get(exc.code)
+            error_handler = self._get_error_handler(exc, blueprint)
             if error_handler:
                 return error_handler(exc)
         if exc.code < 500:
@@ -330,12 +489,14 @@ class GlassApp:
             logger.exception("Error in path [%s]" % request.path)
 
     def _build_response(self, response):
-        if isinstance(response, Response):
+        if isinstance(response, BaseResponse):
             return response
         if isinstance(response, (str, bytes)):
             return Response(response)
         if isinstance(response, dict):
             return JsonResponse(response)
+        if inspect.isgenerator(response) or inspect.isasyncgen(response):
+            return StreamingResponse(response)
         if isinstance(response, tuple):
             try:
                 response, code = response
@@ -353,14 +514,105 @@ class GlassApp:
         request.bind(environ)
         request.app = self
         with self.mount():
-            self.session_cls.open()
-            response = self._call_callback(environ)
-            self.session_cls.save(response)
+            session.open_lazy(self.session_cls)
+            response = (self._pipeline or self._build_pipeline())(environ)
+            if session.loaded:
+                self.session_cls.save(response)
+            # streaming response generators run after this
+            session.saved = True
             self.close_resources()
+        response.make_conditional(environ)
         return response
 
-    def __call__(self, environ, start_response):
+    async def _call_before_request_async(self, blueprint=None):
+        for func in self._before_request_funcs(blueprint):
+            response = await asgi.maybe_await(func())
+            if response:
+                return response
+        return None
+
+    async def _call_after_request_async(self, response, blueprint=None):
+        return_value = None
+        for func in self._after_request_funcs(blueprint):
+            return_value = await asgi.maybe_await(func(response))
+            self._check_after_request(response, return_value)
+        if not return_value:
+            return response
+        return return_value
+
+    async def _call_callback_async(self, environ):
+        blueprint = None
+        try:
+            rule, kwargs = self.router.match(environ)
+            blueprint = rule.blueprint
+            if rule.url_rule.endswith("/"):
+                if not environ["PATH_INFO"].endswith("/"):
+                    return Redirect(environ["PATH_INFO"] + "/", status_code=307)
+            if rule.__class__ is OptionsRule:
+                response = Response("", headers={"Allow": rule.allow})
+            else:
+                response = await self._call_before_request_async(blueprint)
+                if not response:
+                    response = await asgi.maybe_await(rule.callback(**kwargs))
+        except HTTPError as exc:
+            response = await asgi.maybe_await(self._handle_http_exc(exc, blueprint))
+        except Exception as exc:
+            response = await asgi.maybe_await(self._handle_app_exc(exc, blueprint))
+        response = self._build_response(response)
+        return await self._call_after_request_async(response, blueprint)
+
+    async def _get_response_async(self, environ):
+        request.bind(environ)
+        request.app = self
+        with self.mount():
+            session.open_lazy(self.session_cls)
+            response = await self._call_callback_async(environ)
+            if session.loaded:
+                self.session_cls.save(response)
+            # streaming response generators run after this
+            session.saved = True
+            self.close_resources()
+        response.make_conditional(environ)
+        return response
+
+    async def asgi(self, scope, receive, send):
+        """ASGI application, use this to run the app on ASGI server.
+        Views, ``before_request``, ``after_request`` functions and error
+        handlers can be ``async def`` functions. Sync views run on the
+        event loop, so they should not block.
+        ::
 
+            app = GlassApp()
+
+            @app.route('/')
+            async def home():
+                data = await fetch_data()
+                return data
+
+            # uvicorn module:app.asgi
+
+        The WSGI app (``app`` itself) works as before.
+        """
+        if scope["type"] == "lifespan":
+            return await asgi.lifespan(self, receive, send)
+        if scope["type"] != "http":
+            raise ValueError("Unsupported ASGI scope type %s" % scope["type"])
+        if not self.frozen:
+            self.freeze()
+        body = await asgi.read_body(receive)
+        environ = asgi.build_environ(scope, body)
+        response = await self._get_response_async(environ)
+        # streaming responses may use current_app while sending
+        with self.mount():
+            await asgi.send_response(response, environ, send)
+
+    def __call__(self, environ, start_response):
+        if not self.frozen:
+            self.freeze()
         response = self._get_response(environ)
         response.start_response(environ, start_response)
-        return response
+        if environ.get("REQUEST_METHOD") == "HEAD":
+            # headers only, Content-Length is kept
+            response.close()
+            return []
+        return response.get_app_iter(environ)
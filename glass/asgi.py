@@ -0,0 +1,137 @@
+"""ASGI support.
+
+:meth:`GlassApp.asgi <glass.app.GlassApp.asgi>` is the ASGI application,
+serve it with any ASGI server::
+
+   uvicorn app:app.asgi
+
+The request is translated to WSGI environ, so ``request``
+works the same for WSGI and ASGI.
+"""
+import inspect
+import io
+import sys
+
+from glass import utils
+
+
+async def maybe_await(value):
+    """Await ``value`` if it is awaitable, sync and ``async def``
+    views, hooks and error handlers can be mixed.
+    """
+    if inspect.isawaitable(value):
+        return await value
+    return value
+
+
+async def read_body(receive):
+    """Read the whole request body"""
+    body = []
+    while True:
+        message = await receive()
+        if message["type"] == "http.disconnect":
+            break
+        body.append(message.get("body", b""))
+        if not message.get("more_body"):
+            break
+    return b"".join(body)
+
+
+def build_environ(scope, body):
+    """Build WSGI environ from ASGI http scope"""
+    # PEP 3333, environ strings are latin-1
+    path = scope["path"].encode("utf-8").decode("latin-1")
+    root_path = scope.get("root_path", "").encode("utf-8").decode("latin-1")
+    environ = {
+        "REQUEST_METHOD": scope["method"],
+        "SCRIPT_NAME": root_path,
+        "PATH_INFO": path,
+        "QUERY_STRING": scope.get("query_string", b"").decode("latin-1"),
+        "SERVER_PROTOCOL": "HTTP/%s" % scope.get("http_version", "1.1"),
+        "wsgi.version": (1, 0),
+        "wsgi.url_scheme": scope.get("scheme", "http"),
+        "wsgi.input": io.BytesIO(body),
+        "wsgi.errors": sys.stderr,
+        "wsgi.multithread": True,
+        "wsgi.multiprocess": True,
+        "wsgi.run_once": False,
+        "asgi.scope": scope,
+    }
+    server = scope.get("server") or ("localhost", 80)
+    environ["SERVER_NAME"] = server[0]
+    environ["SERVER_PORT"] = str(server[1])
+    client = scope.get("client")
+    if client:
+        environ["REMOTE_ADDR"] = client[0]
+        environ["REMOTE_PORT"] = str(client[1])
+    for name, value in scope.get("headers", []):
+        name = name.decode("latin-1").upper().replace("-", "_")
+        value = value.decode("latin-1")
+        if name not in ("CONTENT_TYPE", "CONTENT_LENGTH"):
+            name = "HTTP_" + name
+        if name in environ:
+            # HTTP/2 sends each cookie in its own header (RFC 9113 8.2.3)
+            separator = "; " if name == "HTTP_COOKIE" else ","
+            value = environ[name] + separator + value
+        environ[name] = value
+    return environ
+
+
+async def send_response(response, environ, send):
+    """Send glass response with ASGI ``send``"""
+    headers = [
+        (name.encode("latin-1"), str(value).encode("latin-1"))
+        for name, value in response.header_list()
+    ]
+    await send(
+        {
+            "type": "http.response.start",
+            "status": response.status_code,
+            "headers": headers,
+        }
+    )
+    try:
+        if environ["REQUEST_METHOD"] == "HEAD":
+            body = b""
+        elif isinstance(response.content, bytes):
+            body = response.content
+        elif hasattr(response, "__aiter__"):
+            # StreamingResponse, each chunk is sent as it is produced
+            try:
+                async for chunk in response:
+                    await send(
+                        {"type": "http.response.body", "body": chunk, "more_body": True}
+                    )
+            finally:
+                if hasattr(response.content, "aclose"):
+                    await response.content.aclose()
+            body = b""
+        else:
+            for chunk in response:
+                await send(
+                    {
+                        "type": "http.response.body",
+                        "body": utils.encode(chunk, response.charset),
+                        "more_body": True,
+                    }
+                )
+            body = b""
+    finally:
+        response.close()
+    await send({"type": "http.response.body", "body": body, "more_body": False})
+
+
+async def lifespan(app, receive, send):
+    """Handle ASGI lifespan, the app is frozen on startup"""
+    while True:
+        message = await receive()
+        if message["type"] == "lifespan.startup":
+            try:
+                app.freeze()
+            except Exception as e:
+                await send({"type": "lifespan.startup.failed", "message": str(e)})
+                return
+            await send({"type": "lifespan.startup.complete"})
+        elif message["type"] == "lifespan.shutdown":
+            await send({"type": "lifespan.shutdown.complete"})
+            return
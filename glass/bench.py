@@ -0,0 +1,173 @@
+"""Benchmarks for glass internals.
+
+::
+
+   glass bench routing
+   glass bench routing --sizes 10,1000 --requests 5000 --output routing.json
+
+The results are written as JSON so runs from different releases
+can be compared.
+"""
+import json
+import platform
+import random
+import time
+
+BENCHMARKS = {}
+
+
+def benchmark(name):
+    def decorator(func):
+        BENCHMARKS[name] = func
+        return func
+
+    return decorator
+
+
+def _view(**kwargs):
+    return ""
+
+
+def make_routes(app, size):
+    """Add ``size`` url rules to the app, mixing static, ``int``,
+    ``str``, ``path`` and optional parameters.
+    Returns list of ``(path, view_name, kwargs)`` matching the rules.
+    """
+    samples = []
+    for i in range(size):
+        kind = i % 5
+        view_name = "view%d" % i
+        if kind == 0:
+            rule = "/s%d/page" % i
+            path, kwargs = rule, {}
+        elif kind == 1:
+            rule = "/i%d/<int:id>" % i
+            path, kwargs = "/i%d/%d" % (i, i), {"id": i}
+        elif kind == 2:
+            rule = "/u%d/<name>/profile" % i
+            path = "/u%d/user%d/profile" % (i, i)
+            kwargs = {"name": "user%d" % i}
+        elif kind == 3:
+            rule = "/f%d/<path:file>" % i
+            path = "/f%d/css/%d.css" % (i, i)
+            kwargs = {"file": "css/%d.css" % i}
+        else:
+            rule = "/o%d/<name>/<int:page>?" % i
+            path, kwargs = "/o%d/posts" % i, {"name": "posts"}
+        app.add_url_rule(rule, _view, view_name=view_name)
+        samples.append((path, view_name, kwargs))
+    return samples
+
+
+def _timings(func, args_list):
+    timings = []
+    timer = time.perf_counter_ns
+    for args in args_list:
+        start = timer()
+        func(*args)
+        timings.append(timer() - start)
+    return timings
+
+
+def _summary(timings):
+    timings = sorted(timings)
+    total = sum(timings) or 1
+    size = len(timings)
+    return {
+        "calls": size,
+        "ops_per_sec": round(size / (total / 1e9), 1),
+        "p50_us": round(timings[int(0.50 * (size - 1))] / 1000, 3),
+        "p99_us": round(timings[int(0.99 * (size - 1))] / 1000, 3),
+    }
+
+
+def _time_match(router, environs):
+    match = router.match
+
+    def cold_match(environ):
+        router.cache.clear()
+        match(environ)
+
+    # first match also builds lazy structures
+    match(environs[0][0])
+    cold = _timings(cold_match, environs)
+    # fill the cache, then measure
+    for args in environs:
+        match(*args)
+    warm = _timings(match, environs)
+    return {"cold": _summary(cold), "warm": _summary(warm)}
+
+
+@benchmark("routing")
+def bench_routing(
+    sizes=(10, 100, 1000, 10000), requests=20000, matcher=None, seed=0
+):
+    """Measure :meth:`Router.match` and :func:`url_for` on
+    synthetic route tables.
+    ``match`` is measured on the frozen router, as apps serve requests,
+    ``match_unfrozen`` before :meth:`GlassApp.freeze` for comparison.
+    """
+    from glass import GlassApp
+    from glass.routing import url_for
+
+    rand = random.Random(seed)
+    results = []
+    for size in sizes:
+        apps = []
+        for _ in range(2):
+            app = GlassApp()
+            if matcher:
+                app.config["ROUTE_MATCHER"] = matcher
+            samples = make_routes(app, size)
+            apps.append(app)
+        unfrozen, app = apps
+        app.freeze()
+        picked = [rand.choice(samples) for _ in range(requests)]
+        environs = [
+            ({"PATH_INFO": path, "REQUEST_METHOD": "GET"},) for path, _, _ in picked
+        ]
+        router = app.router
+        match_timings = _time_match(router, environs)
+        unfrozen_timings = _time_match(unfrozen.router, environs)
+
+        url_args = [(view_name, kwargs) for _, view_name, kwargs in picked]
+        with app.mount():
+            url_for_timings = _timings(lambda name, kw: url_for(name, **kw), url_args)
+
+        results.append(
+            {
+                "routes": size,
+                "match": match_timings,
+                "match_unfrozen": unfrozen_timings,
+                "url_for": _summary(url_for_timings),
+                "cache": router.cache.info(),
+            }
+        )
+    return {
+        "benchmark": "routing",
+        "matcher": matcher or "tree",
+        "requests": requests,
+        "results": results,
+    }
+
+
+def run(name, output=None, **kwargs):
+    """Run benchmark ``name`` and write the result as JSON to ``output``
+    file or return it.
+    """
+    import glass
+
+    try:
+        func = BENCHMARKS[name]
+    except KeyError:
+        raise ValueError(
+            "unknown benchmark %s, choose from %s" % (name, ", ".join(BENCHMARKS))
+        )
+    result = func(**kwargs)
+    result["glass"] = glass.__version__
+    result["python"] = platform.python_version()
+    data = json.dumps(result, indent=2)
+    if output:
+        with open(output, "w", encoding="utf-8") as file:
+            file.write(data)
+    return data
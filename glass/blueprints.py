@@ -0,0 +1,115 @@
+from glass.routing import Router
+
+
+class Blueprint:
+    """Group of views mounted on the app under a url prefix.
+    The blueprint has its own router, ``before_request`` and
+    ``after_request`` functions and error handlers, they are only
+    used for the views of the blueprint.
+    ::
+
+      from glass import Blueprint, GlassApp
+
+      api = Blueprint('api', url_prefix='/api')
+
+      @api.route('/users')
+      def users():
+          return {'users': []}
+
+      @api.before_request
+      def check_token():
+          ...
+
+      app = GlassApp()
+      app.register_blueprint(api)
+      # url_for('api.users')
+    """
+
+    def __init__(self, name, url_prefix=""):
+        self.name = name
+        self.url_prefix = url_prefix
+        self.router = Router()
+        self.app = None
+        self.before_request_funcs = []
+        self.after_request_funcs = []
+        self.error_code_handlers = {}
+        self.error_handlers = {}
+        # rules added before the blueprint is registered
+        self._deferred = []
+
+    def route(self, url_rule, methods="GET", view_name=None, **kwargs):
+        """Register a view function for URL, same as :meth:`GlassApp.route`.
+        The url rule is prefixed with the blueprint ``url_prefix``.
+        """
+
+        def decorator(func):
+            args = (url_rule, func, methods, view_name, kwargs)
+            if self.app is None:
+                self._deferred.append(args)
+            else:
+                self._add_rule(*args)
+            return func
+
+        return decorator
+
+    def _add_rule(self, url_rule, func, methods, view_name, kwargs):
+        url_rule = self.url_prefix + url_rule
+        self.app._add_rule(
+            url_rule, func, methods, view_name, blueprint=self, **kwargs
+        )
+
+    def add_url_rule(self, rule, func, methods=None, view_name=None):
+        return self.route(rule, methods, view_name)(func)
+
+    def get(self, url_rule, **kwargs):
+        return self.route(url_rule, "GET", **kwargs)
+
+    def post(self, url_rule, **kwargs):
+        return self.route(url_rule, "POST", **kwargs)
+
+    def before_request(self, func):
+        """Register a function to run before each request to the
+        blueprint views, after the app ``before_request`` functions.
+        """
+        self.before_request_funcs.append(func)
+        if self.app is not None:
+            self.app._reset_pipeline()
+        return func
+
+    def after_request(self, func):
+        """Register a function to run after each request to the
+        blueprint views, before the app ``after_request`` functions.
+        """
+        self.after_request_funcs.append(func)
+        if self.app is not None:
+            self.app._reset_pipeline()
+        return func
+
+    def error(self, error):
+        """Register error handler for the blueprint views,
+        see :meth:`GlassApp.error`
+        """
+
+        def decorator(func):
+            if isinstance(error, int):
+                self.error_code_handlers[error] = func
+            else:
+                self.error_handlers[error] = func
+            if self.app is not None:
+                self.app._reset_pipeline()
+            return func
+
+        return decorator
+
+    def register(self, app, url_prefix=None):
+        if self.app is not None:
+            raise RuntimeError("Blueprint %s is already registered" % self.name)
+        if url_prefix is not None:
+            self.url_prefix = url_prefix
+        self.url_prefix = self.url_prefix.rstrip("/")
+        self.app = app
+        self.router.app = app
+        app.router.mount(self.url_prefix, self.router)
+        for args in self._deferred:
+            self._add_rule(*args)
+        self._deferred = []
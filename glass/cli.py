@@ -1,4 +1,6 @@
 import argparse
+import gzip
+import io
 import os
 import sys
 
@@ -14,6 +16,8 @@ Commands:
  routes   Show routes for the app
  run      Run the app developemnt server
  config   Show the app configurations
+ bench    Run benchmarks, glass bench routing
+ compress-static  Write compressed static files
 
 run
 =======
@@ -25,6 +29,29 @@ Start the app development server
 Options:
     --host server host [default: localhost]
     --port server port [default: 8000]
+
+bench
+=======
+
+glass bench routing
+
+Benchmark routing and url building, the result is printed as JSON
+
+Options:
+    --sizes number of routes, comma separated [default: 10,100,1000,10000]
+    --requests number of requests for each size [default: 20000]
+    --matcher route matcher, tree or regex [default: tree]
+    --output write the result to file
+
+compress-static
+=================
+
+glass compress-static [folder]
+
+Write gzip (.gz), brotli (.br) and zstd (.zst) files next to the
+css, js, html, svg, json... files in the folder [default: app STATIC_FOLDER].
+brotli and zstd are written if the brotli and zstandard modules are installed.
+The app sends them to browsers accepting the encoding.
 """
 
 
@@ -122,12 +149,120 @@ def show_routes(arg):
     print("".join(lines))
 
 
+def run_bench(arg):
+    from glass import bench
+
+    kwargs = {"requests": int(arg.requests)}
+    if arg.sizes:
+        kwargs["sizes"] = [int(size) for size in arg.sizes.split(",")]
+    if arg.matcher:
+        kwargs["matcher"] = arg.matcher
+    print(bench.run(arg.target or "routing", output=arg.output, **kwargs))
+
+
+COMPRESS_EXTENSIONS = {
+    ".css",
+    ".js",
+    ".mjs",
+    ".map",
+    ".html",
+    ".htm",
+    ".svg",
+    ".json",
+    ".xml",
+    ".txt",
+    ".wasm",
+    ".ico",
+}
+
+
+def _gzip(data):
+    buffer = io.BytesIO()
+    # mtime=0, same output for same file
+    with gzip.GzipFile(fileobj=buffer, mode="wb", compresslevel=9, mtime=0) as file:
+        file.write(data)
+    return buffer.getvalue()
+
+
+def get_compressors():
+    """Available compressors, ``{encoding: compress function}``"""
+    compressors = {"gzip": _gzip}
+    try:
+        import brotli
+    except ImportError:
+        pass
+    else:
+        compressors["br"] = lambda data: brotli.compress(data, quality=11)
+    try:
+        import zstandard
+    except ImportError:
+        pass
+    else:
+        compressors["zstd"] = zstandard.ZstdCompressor(level=19).compress
+    return compressors
+
+
+def compress_static(folder, min_size=256):
+    """Write compressed files next to the static files in ``folder``.
+    Files up to date are skipped, the compressed file has the same
+    mtime as the file. Returns the written paths.
+    """
+    from glass.response import STATIC_ENCODINGS
+
+    extensions = dict(STATIC_ENCODINGS)
+    compressors = get_compressors()
+    written = []
+    for root, _, files in os.walk(folder):
+        for name in sorted(files):
+            if os.path.splitext(name)[1].lower() not in COMPRESS_EXTENSIONS:
+                continue
+            path = os.path.join(root, name)
+            stat = os.stat(path)
+            if stat.st_size < min_size:
+                continue
+            data = None
+            for encoding, compress in compressors.items():
+                target = path + extensions[encoding]
+                try:
+                    if os.stat(target).st_mtime_ns == stat.st_mtime_ns:
+                        continue
+                except OSError:
+                    pass
+                if data is None:
+                    with open(path, "rb") as file:
+                        data = file.read()
+                compressed = compress(data)
+                if len(compressed) >= len(data):
+                    if os.path.exists(target):
+                        os.remove(target)
+                    continue
+                with open(target, "wb") as file:
+                    file.write(compressed)
+                os.utime(target, ns=(stat.st_atime_ns, stat.st_mtime_ns))
+                written.append(target)
+    return written
+
+
+def run_compress_static(arg):
+    folder = arg.target
+    if not folder:
+        app = find_app(arg.app)
+        folder = app.config["STATIC_FOLDER"] or os.path.join(os.getcwd(), "static")
+    for path in compress_static(folder):
+        print(path)
+
+
 def main():
     parser = argparse.ArgumentParser(description="Glass cli", usage=usage)
     parser.add_argument("cmd")
+    parser.add_argument("target", nargs="?")
     parser.add_argument("--app", default="app.py")
     parser.add_argument("--port", default=8000)
     parser.add_argument("--host", default="localhost")
+    parser.add_argument("--sizes", default="")
+    parser.add_argument("--requests", default=20000)
+    parser.add_argument("--matcher", default="")
+    parser.add_argument("--output", default="")
     p = parser.parse_args()
     # import pdb
     # pdb.set_trace()
@@ -135,6 +270,10 @@ def main():
         show_routes(p)
     elif p.cmd == "run":
         run_app(p)
+    elif p.cmd == "bench":
+        run_bench(p)
+    elif p.cmd == "compress-static":
+        run_compress_static(p)
 
 
 if __name__ == "__main__":
@@ -4,6 +4,11 @@ DEFAULT_CONFIG = {
     "DEBUG": True,
     "MAX_CONTENT_LENGTH": None,
     "MAX_COOKIE_SIZE": 4093,
+    "ROUTE_MATCHER": "tree",
+    "ROUTE_CACHE_SIZE": 1024,
+    "JSON_BACKEND": "auto",
+    "FILE_BLOCK_SIZE": 64 * 1024,
+    "STATIC_RECHECK_INTERVAL": 2,
 }
 
 SESSION_CONFIG = {
@@ -15,6 +20,8 @@ SESSION_CONFIG = {
     "SESSION_COOKIE_SAMESITE": None,
     "SECRET_KEY": "",
     "SESSION_COOKIE_MAXAGE": None,
+    "SESSION_COMPRESS_THRESHOLD": 256,
+    "SESSION_REFRESH_FRACTION": 0.5,
 }
 
 DEFAULT_CONFIG.update(SESSION_CONFIG)
@@ -67,6 +67,16 @@ class MethodNotAllow(HTTPError):
     code = 405
     description = "The method not allow for the requested path"
 
+    def __init__(self, description="", code=None, allow=""):
+        super().__init__(description, code)
+        self.allow = allow
+
+    def headers(self):
+        header = super().headers()
+        if self.allow:
+            header.append(("Allow", self.allow))
+        return header
+
 
 class InternalServerError(HTTPError):
     code = 500
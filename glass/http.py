@@ -66,3 +66,49 @@ HTTP_STATUS_CODES = {
     510: "Not Extended",
     511: "Network Authentication Failed",
 }
+
+
+def parse_range(header, size, max_ranges=16):
+    """Parse ``Range`` header for a body of ``size`` bytes.
+
+    Returns list of ``(start, end)`` byte positions (end inclusive),
+    empty list if no range is satisfiable (``416``) or ``None`` if the
+    header is invalid or has more than ``max_ranges`` ranges, the
+    whole body should be sent then.
+    ::
+
+        >>> parse_range('bytes=0-99,-100', 1000)
+        [(0, 99), (900, 999)]
+    """
+    unit, _, spec = header.partition("=")
+    if unit.strip().lower() != "bytes":
+        return None
+    ranges = []
+    parts = spec.split(",")
+    if len(parts) > max_ranges:
+        return None
+    for part in parts:
+        part = part.strip()
+        if not part:
+            continue
+        first, sep, last = part.partition("-")
+        first, last = first.strip(), last.strip()
+        if not sep or (first and not first.isdigit()) or (last and not last.isdigit()):
+            return None
+        if not first:
+            # suffix range, the last bytes
+            if not last:
+                return None
+            length = int(last)
+            if length and size:
+                ranges.append((max(size - length, 0), size - 1))
+            continue
+        start = int(first)
+        end = size - 1
+        if last:
+            end = int(last)
+            if end < start:
+                return None
+        if start < size:
+            ranges.append((start, min(end, size - 1)))
+    return ranges
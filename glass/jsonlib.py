@@ -0,0 +1,104 @@
+"""JSON backends used by :class:`~glass.response.JsonResponse` and
+:meth:`request.get_json() <glass.requests.Request.get_json>`.
+
+The backend is set with ``JSON_BACKEND`` config:
+
+- ``auto`` use ``orjson`` if it is installed, else ``stdlib`` (default).
+- ``orjson`` fast encoder, writes ``bytes`` directly.
+- ``stdlib`` python ``json`` module.
+
+Both backends write compact utf-8 ``bytes`` and serialize dataclasses,
+``datetime``, ``date``, ``time`` and ``UUID``.
+"""
+import dataclasses
+import datetime
+import json
+import uuid
+
+from glass._helpers import current_app as app
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+def default(obj):
+    """Serialize objects not supported by ``json``"""
+    if dataclasses.is_dataclass(obj) and not isinstance(obj, type):
+        return dataclasses.asdict(obj)
+    if isinstance(obj, (datetime.datetime, datetime.date, datetime.time)):
+        return obj.isoformat()
+    if isinstance(obj, uuid.UUID):
+        return str(obj)
+    raise TypeError("Object of type %s is not JSON serializable" % type(obj).__name__)
+
+
+class StdlibBackend:
+    name = "stdlib"
+
+    def __init__(self):
+        # json.dumps creates new encoder when called with options
+        self._encode = json.JSONEncoder(
+            default=default, ensure_ascii=False, separators=(",", ":")
+        ).encode
+
+    def dumps(self, obj):
+        return self._encode(obj).encode("utf-8")
+
+    def loads(self, data):
+        return json.loads(data)
+
+
+class OrjsonBackend:
+    name = "orjson"
+
+    def __init__(self):
+        if orjson is None:
+            raise ImportError("orjson module is not installed")
+        self._dumps = orjson.dumps
+        self._option = orjson.OPT_NON_STR_KEYS
+        self.loads = orjson.loads
+
+    def dumps(self, obj):
+        return self._dumps(obj, default=default, option=self._option)
+
+
+BACKENDS = {"stdlib": StdlibBackend, "orjson": OrjsonBackend}
+_backends = {}
+
+
+def get_backend(name=None):
+    """Returns JSON backend ``name``, the app ``JSON_BACKEND``
+    config is used if ``name`` is not given.
+    """
+    if name is None:
+        try:
+            name = app.config["JSON_BACKEND"]
+        except RuntimeError:
+            # outside of app context
+            name = None
+    name = name or "auto"
+    try:
+        return _backends[name]
+    except KeyError:
+        pass
+    if name == "auto":
+        backend = get_backend("orjson" if orjson is not None else "stdlib")
+    else:
+        try:
+            backend = BACKENDS[name]()
+        except KeyError:
+            raise ValueError("Unknown JSON backend %s" % name) from None
+    _backends[name] = backend
+    return backend
+
+
+def dumps(obj):
+    """Serialize ``obj`` to JSON ``bytes``"""
+    return get_backend().dumps(obj)
+
+
+def loads(data):
+    """Deserialize JSON ``str`` or ``bytes``"""
+    return get_backend().loads(data)
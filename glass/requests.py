@@ -1,15 +1,20 @@
 import io
-import json
 import logging
 import os
 import urllib.parse
 from http.cookies import SimpleCookie
 
 import multipart
+from glass import jsonlib
 from glass._helpers import current_app
 from glass.exception import BadRequest, RequestTooLarge
 from glass.types import WSGIHeader
-from glass.utils import _thread_local, cached_property
+from glass.utils import (
+    RequestContext,
+    _context_property,
+    cached_property,
+    request_context,
+)
 from multipart import parse_form_data
 
 logger = logging.getLogger("glass.app")
@@ -37,11 +42,12 @@ class Request:
 
     """
 
-    __storage__ = _thread_local()
-    environ = _thread_local()
+    __storage__ = _context_property("storage")
+    environ = _context_property("environ")
 
     def __init__(self, environ=None):
-        self.environ = environ
+        if environ is not None:
+            self.bind(environ)
 
     @cached_property()
     def path(self):
@@ -106,7 +112,7 @@ class Request:
         if not "application/json" in self.content_type:
             return None
         body = self.get_data()
-        return json.loads(body)
+        return jsonlib.loads(body)
 
     def get_data(self):
         """Returns data sent to server as ``bytes``.
@@ -244,8 +250,7 @@ class Request:
 
     def bind(self, env):
         """Bind request to  wsgi environ"""
-        self.environ = env
-        self.__storage__ = {}
+        request_context.set(RequestContext(env))
 
 
 request = Request()
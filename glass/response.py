@@ -1,13 +1,18 @@
+import contextvars
+import functools
 import io
-import json
 import mimetypes
 import os
 import re
+import secrets
+import threading
+import time
 from datetime import datetime
-from email.utils import parsedate_tz
+from email.utils import formatdate, parsedate_tz
+from stat import S_ISREG
 from urllib.parse import unquote as urlunquote
 
-from glass import http, utils
+from glass import http, jsonlib, utils
 from glass.cookie import HTTPCookie
 from glass.sessions import session
 from glass.templating import render_template
@@ -23,6 +28,15 @@ def _charset_from_content_type(text):
     return
 
 
+def _guess_content_type(filename):
+    mime_type, encoding = mimetypes.guess_type(filename)
+    if mime_type:
+        if encoding:
+            return mime_type + "; charset=%s" % encoding
+        return mime_type
+    return "application/octet-stream"
+
+
 class BaseResponse:
     """Base Response class.
     This class is not returned directly, but it is subclassed
@@ -128,11 +142,16 @@ class BaseResponse:
 
         self.headers.add(name, value, **kwargs)
 
-    def start_response(self, environ, start_response):
-        # self.set_headers()
+    def header_list(self):
+        """Response headers and cookies as list of ``(name, value)``"""
         headers = list(self.headers.items())
         for cookie in self.cookies:
             headers.append(cookie.as_wsgi())
+        return headers
+
+    def start_response(self, environ, start_response):
+        # self.set_headers()
+        headers = self.header_list()
         reason = http.HTTP_STATUS_CODES.get(self.status_code, "Unknown")
         # headers.append(self.default_headers())
         start_response("%s %s" % (self.status_code, reason), headers)
@@ -146,6 +165,15 @@ class BaseResponse:
             return map(utils.encode, (self.content,))
         return map(utils.encode, iter(self.content))
 
+    def make_conditional(self, environ):
+        """Update the response for the request conditional headers,
+        called before the response is sent.
+        """
+
+    def get_app_iter(self, environ):
+        """Returns the iterable returned to the WSGI server"""
+        return self
+
     def close(self):
         if hasattr(self.content, "close"):
             self.content.close()
@@ -180,6 +208,73 @@ class Response(BaseResponse):
             self.content = b""
 
 
+class StreamingResponse(BaseResponse):
+    """Send the response body chunk by chunk as the generator yields
+    it. Headers are sent first, no ``Content-Length`` is set and the
+    body is never held in memory.
+
+    :param content: generator, async generator or any iterable of
+        ``str`` or ``bytes``. Async generators need the ASGI app
+        (:meth:`GlassApp.asgi <glass.app.GlassApp.asgi>`).
+
+    Views returning generator are sent with this class.
+    ::
+
+       @app.route('/export.csv')
+       def export():
+           def rows():
+               yield 'id,name\n'
+               for user in db.users():
+                   yield '%s,%s\n' % (user.id, user.name)
+           return StreamingResponse(rows(), content_type='text/csv')
+
+    The generator runs after the view returns, in the context of the
+    request, so ``request``, ``url_for`` and ``session`` reads work in it.
+    The session is saved before the generator runs, modifying it in
+    the generator raises :class:`RuntimeError`, set it in the view.
+    Flashed messages are taken out of the session when the response is
+    created, they can be read in the generator.
+    """
+
+    def __init__(self, content, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.content = content
+        session.take_flashes()
+        self.context = contextvars.copy_context()
+
+    def __iter__(self):
+        if hasattr(self.content, "__aiter__"):
+            raise TypeError(
+                "async generator response can only be sent with app.asgi"
+            )
+        iterator = iter(self.content)
+        run = self.context.run
+        charset = self.charset
+        while True:
+            try:
+                chunk = run(next, iterator)
+            except StopIteration:
+                return
+            if chunk:
+                yield utils.encode(chunk, charset)
+
+    async def __aiter__(self):
+        if not hasattr(self.content, "__aiter__"):
+            for chunk in self:
+                yield chunk
+            return
+        charset = self.charset
+        async for chunk in self.content:
+            if chunk:
+                yield utils.encode(chunk, charset)
+
+    def close(self):
+        if hasattr(self.content, "aclose"):
+            # closed by the ASGI server loop, see glass.asgi
+            return
+        super().close()
+
+
 class JsonResponse(Response):
     """Return json object as response.
     see :class:`glass.response.BaseResponse` for
@@ -193,7 +288,8 @@ class JsonResponse(Response):
     """
 
     def __init__(self, content, *args, **kwargs):
-        content = json.dumps(content)
+        # utf-8 bytes from the JSON_BACKEND, see glass.jsonlib
+        content = jsonlib.dumps(content)
         super().__init__(content, *args, **kwargs)
         self.headers["Content-Type"] = "application/json; charset=%s" % self.charset
 
@@ -225,12 +321,25 @@ class FileResponse(Response):
        def send_file():
           return FileResponse('/path/to/file.jpg')
 
+    The file is handed to the server ``wsgi.file_wrapper`` if it provides
+    one, so the server can send it with ``os.sendfile``. Otherwise the
+    file is read ``block_size`` bytes at a time.
+
+    ``Range`` requests are answered with ``206 Partial Content``,
+    see :meth:`make_conditional`.
+
+    :param block_size: read size when ``wsgi.file_wrapper`` is not available
     """
 
     max_size = 10000000
-    max_read = 4028
-
-    def __init__(self, file, *args, **kwargs):
+    block_size = 64 * 1024
+    #: ``(start, end)`` byte ranges sent, ``None`` for the whole file
+    ranges = None
+    _parts = None
+
+    def __init__(self, file, *args, block_size=None, **kwargs):
+        if block_size:
+            self.block_size = block_size
         if isinstance(file, (str, bytes)):
             self.filename = file
             # The file will be closed once the response is
@@ -256,23 +365,110 @@ class FileResponse(Response):
             headers["Content-Length"] = os.stat(self.filename).st_size
         content_type = headers.get("Content-Type")
         if not content_type:
-            mime_type, encoding = mimetypes.guess_type(self.filename)
-            if mime_type:
-                content_type = mime_type
-                if encoding:
-                    content_type = mime_type + "; charset=%s" % encoding
-            else:
-                content_type = "application/octet-stream"
-            headers["Content-Type"] = content_type
+            headers["Content-Type"] = _guess_content_type(self.filename)
         return headers
 
-    def __iter__(self):
-        while 1:
-            data = self.content.read(2048)
+    def make_conditional(self, environ):
+        """Answer ``Range`` request with ``206 Partial Content``, several
+        ranges are sent as ``multipart/byteranges`` and ranges out of the
+        file with ``416``. ``If-Range`` must match the ``ETag`` or
+        ``Last-Modified`` header, else the whole file is sent.
+        """
+        self.headers["Accept-Ranges"] = "bytes"
+        range_header = environ.get("HTTP_RANGE")
+        if not range_header or self.status_code != 200:
+            return
+        if environ.get("REQUEST_METHOD") not in ("GET", "HEAD"):
+            return
+        if_range = environ.get("HTTP_IF_RANGE")
+        if if_range and if_range not in (
+            self.headers.get("ETag"),
+            self.headers.get("Last-Modified"),
+        ):
+            # the file has changed
+            return
+        size = int(self.headers["Content-Length"])
+        ranges = http.parse_range(range_header, size)
+        if ranges is None:
+            return
+        self.ranges = ranges
+        self._size = size
+        if not ranges:
+            self.status_code = 416
+            self.headers["Content-Range"] = "bytes */%d" % size
+            self.headers["Content-Length"] = "0"
+            return
+        self.status_code = 206
+        if len(ranges) == 1:
+            start, end = ranges[0]
+            self.headers["Content-Range"] = "bytes %d-%d/%d" % (start, end, size)
+            self.headers["Content-Length"] = str(end - start + 1)
+            return
+        boundary = secrets.token_hex(16)
+        content_type = self.headers["Content-Type"]
+        parts = []
+        length = 0
+        for start, end in ranges:
+            head = (
+                "--%s\r\nContent-Type: %s\r\nContent-Range: bytes %d-%d/%d\r\n\r\n"
+                % (boundary, content_type, start, end, size)
+            ).encode("latin-1")
+            parts.append((head, start, end))
+            # head, data, CRLF
+            length += len(head) + end - start + 1 + 2
+        self._parts = parts
+        self._closing = ("--%s--\r\n" % boundary).encode("latin-1")
+        length += len(self._closing)
+        self.headers["Content-Type"] = "multipart/byteranges; boundary=%s" % boundary
+        self.headers["Content-Length"] = str(length)
+
+    def get_app_iter(self, environ):
+        file_wrapper = environ.get("wsgi.file_wrapper")
+        if file_wrapper is None:
+            return self
+        if self.ranges is None:
+            return file_wrapper(self.content, self.block_size)
+        if self._parts is None and self.ranges:
+            start, end = self.ranges[0]
+            if end == self._size - 1:
+                # the range ends at the end of file, sendfile
+                # from the start of the range
+                self.content.seek(start)
+                return file_wrapper(self.content, self.block_size)
+        return self
+
+    def _read(self, start=None, end=None):
+        # the WSGI server needs new bytes object for every
+        # chunk, reading into reused buffer would still copy
+        read = self.content.read
+        block_size = self.block_size
+        if start is None:
+            # never more than Content-Length, the file may have grown
+            remaining = int(self.headers["Content-Length"])
+        else:
+            self.content.seek(start)
+            remaining = end - start + 1
+        while remaining > 0:
+            data = read(min(block_size, remaining))
             if not data:
                 return
+            remaining -= len(data)
             yield data
 
+    def __iter__(self):
+        ranges = self.ranges
+        if ranges is None:
+            yield from self._read()
+        elif self._parts is None:
+            if ranges:
+                yield from self._read(*ranges[0])
+        else:
+            for head, start, end in self._parts:
+                yield head
+                yield from self._read(start, end)
+                yield b"\r\n"
+            yield self._closing
+
 
 class TemplateResponse(Response):
     def __init__(self, template, context=None, **kwargs):
@@ -295,36 +491,217 @@ class StaticResponse(FileResponse):
     pass
 
 
+#: Content-Encoding and file extension of precompressed static files,
+#: in order of preference
+STATIC_ENCODINGS = (("br", ".br"), ("zstd", ".zst"), ("gzip", ".gz"))
+
+
+@functools.lru_cache(maxsize=256)
+def _accepted_encodings(accept_encoding):
+    """Content codings accepted in ``Accept-Encoding`` header"""
+    accepted = set()
+    for coding in accept_encoding.lower().split(","):
+        coding, _, params = coding.partition(";")
+        params = params.replace(" ", "")
+        if params.startswith("q="):
+            try:
+                if float(params[2:]) <= 0:
+                    # not acceptable
+                    continue
+            except ValueError:
+                continue
+        accepted.add(coding.strip())
+    if "*" in accepted:
+        accepted.update(name for name, _ in STATIC_ENCODINGS)
+    return frozenset(accepted)
+
+
+class StaticFile:
+    """Metadata of static file kept by :class:`StaticFiles`"""
+
+    __slots__ = (
+        "path",
+        "size",
+        "mtime_ns",
+        "content_type",
+        "etag",
+        "last_modified",
+        "checked",
+        "encodings",
+    )
+
+    def __init__(self, path, stat, checked):
+        self.path = path
+        self.size = stat.st_size
+        self.mtime_ns = stat.st_mtime_ns
+        self.content_type = _guess_content_type(path)
+        self.etag = '"%x-%x"' % (stat.st_mtime_ns, stat.st_size)
+        self.last_modified = formatdate(stat.st_mtime, usegmt=True)
+        self.checked = checked
+        self.find_encodings()
+
+    def find_encodings(self):
+        """Find the precompressed files (``file.css.br``, ``file.css.gz``)
+        which are not older than the file. ``encodings`` is list of
+        ``(encoding, path, size, etag)``.
+        """
+        encodings = []
+        for encoding, ext in STATIC_ENCODINGS:
+            path = self.path + ext
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            if stat.st_mtime_ns < self.mtime_ns:
+                # stale, the file has changed
+                continue
+            etag = '"%x-%x-%s"' % (self.mtime_ns, stat.st_size, encoding)
+            encodings.append((encoding, path, stat.st_size, etag))
+        self.encodings = encodings
+
+    def select(self, accept_encoding):
+        """Returns ``(encoding, path, size, etag)`` of the file
+        to send for ``Accept-Encoding`` header.
+        """
+        if self.encodings and accept_encoding:
+            accepted = _accepted_encodings(accept_encoding)
+            for variant in self.encodings:
+                if variant[0] in accepted:
+                    return variant
+        return None, self.path, self.size, self.etag
+
+
+class StaticFiles:
+    """In process metadata cache of static files (size, mtime,
+    content type, ``ETag`` and ``Last-Modified``).
+    A cached file is checked again with ``os.stat`` when it is older than
+    ``STATIC_RECHECK_INTERVAL`` seconds, hot files are served without
+    extra system calls.
+    """
+
+    maxsize = 4096
+
+    def __init__(self, app):
+        self.app = app
+        self._files = {}
+        self._lock = threading.Lock()
+
+    def get(self, path, recheck=False):
+        """Returns :class:`StaticFile` for file ``path``,
+        ``None`` if it is not a file.
+
+        :param recheck: ``os.stat`` the file even if the entry is recent
+        """
+        now = time.monotonic()
+        entry = self._files.get(path)
+        interval = self.app.config["STATIC_RECHECK_INTERVAL"] or 0
+        if entry is not None and not recheck and now - entry.checked < interval:
+            return entry
+        try:
+            stat = os.stat(path)
+        except OSError:
+            self._files.pop(path, None)
+            return None
+        if not S_ISREG(stat.st_mode):
+            return None
+        if (
+            entry is not None
+            and entry.mtime_ns == stat.st_mtime_ns
+            and entry.size == stat.st_size
+        ):
+            entry.checked = now
+            entry.find_encodings()
+            return entry
+        entry = StaticFile(path, stat, now)
+        with self._lock:
+            if path not in self._files and len(self._files) >= self.maxsize:
+                # drop the oldest entry
+                del self._files[next(iter(self._files))]
+            self._files[path] = entry
+        return entry
+
+    def clear(self):
+        self._files.clear()
+
+
+def _etag_matches(etag, if_none_match):
+    if if_none_match.strip() == "*":
+        return True
+    for tag in if_none_match.split(","):
+        tag = tag.strip()
+        if tag.startswith("W/"):
+            # weak comparison
+            tag = tag[2:]
+        if tag == etag:
+            return True
+    return False
+
+
 def send_static(filename, app, request):
     """Send static file (css,jss,images,...)"""
     filename = urlunquote(filename)
     if filename.startswith("../") or os.path.isabs(filename) or filename == "..":
         return Response("Not Found", status_code=404)
 
-    if_modified = request.headers.get("If-Modified-Since")
     static = app.config["STATIC_FOLDER"]
     if not static:
         static = os.path.join(os.getcwd(), "static")
+    static = os.path.abspath(static)
     file = os.path.abspath(os.path.join(static, filename))
-    if not os.path.exists(file) or not os.path.isfile(file):
-        return Response("Not Found", status_code=404)
-    try:
-        mtime = os.stat(file).st_mtime
-    except OSError:
+    if not file.startswith(static + os.sep):
+        # "css/../../file"
         return Response("Not Found", status_code=404)
-    mtime = datetime.utcfromtimestamp(mtime)
-    if if_modified:
-        time_tuple = parsedate_tz(if_modified)
-        if time_tuple:
-            if_modified = datetime(*time_tuple[:6])
-            if not mtime > if_modified:
-                return Response("", status_code=304)
-    last_modified = mtime.strftime("%a, %d %b %Y %H:%M:%S GMT")
-    headers = {
-        "Cache-Control": "public, max-age=3153600",
-        "Last-Modified": last_modified,
-    }
-    return FileResponse(file, headers=headers)
+    accept_encoding = request.headers.get("Accept-Encoding")
+    recheck = False
+    while True:
+        entry = app.static_files.get(file, recheck)
+        if entry is None:
+            return Response("Not Found", status_code=404)
+        encoding, path, size, etag = entry.select(accept_encoding)
+        headers = {
+            "Cache-Control": "public, max-age=3153600",
+            "Last-Modified": entry.last_modified,
+            "ETag": etag,
+        }
+        if entry.encodings:
+            headers["Vary"] = "Accept-Encoding"
+        if_none_match = request.headers.get("If-None-Match")
+        if if_none_match:
+            if _etag_matches(etag, if_none_match):
+                return Response("", status_code=304, headers=headers)
+        else:
+            if_modified = request.headers.get("If-Modified-Since")
+            if if_modified:
+                time_tuple = parsedate_tz(if_modified)
+                if time_tuple:
+                    if_modified = datetime(*time_tuple[:6])
+                    mtime = datetime.utcfromtimestamp(entry.mtime_ns // 1000000000)
+                    if not mtime > if_modified:
+                        return Response("", status_code=304, headers=headers)
+        try:
+            content = open(path, "rb")
+        except OSError:
+            # removed since it was cached
+            if recheck:
+                return Response("Not Found", status_code=404)
+            recheck = True
+            continue
+        # the cached size can be STATIC_RECHECK_INTERVAL old,
+        # Content-Length must be the size of the opened file
+        opened_size = os.fstat(content.fileno()).st_size
+        if opened_size == size or recheck:
+            size = opened_size
+            break
+        # changed since it was cached
+        content.close()
+        recheck = True
+    headers["Content-Type"] = entry.content_type
+    headers["Content-Length"] = size
+    if encoding:
+        headers["Content-Encoding"] = encoding
+    return FileResponse(
+        content, headers=headers, block_size=app.config["FILE_BLOCK_SIZE"]
+    )
 
 
 def redirect(location, code=302, response=""):
@@ -338,13 +715,22 @@ def flash(message, category=None):
     if not flashes:
         flashes = session["__flash__"] = []
     flashes.append(message)
+    session.modified = True
 
 
 def messages():
+    taken = session.flashes
+    if taken is not None:
+        # taken out of the session by StreamingResponse
+        session.flashes = None
+        yield from taken
+        return
     msgs = session.get("__flash__", [])
     for msg in msgs:
         yield msg
-    msgs.clear()
+    if msgs:
+        msgs.clear()
+        session.modified = True
 
 
 get_session_messages = flash_messages = messages
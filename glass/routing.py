@@ -1,7 +1,9 @@
+import functools
 import re
 import types
+from collections import OrderedDict
 from urllib.parse import quote as urlquote
-from urllib.parse import urlencode, urlparse, urlunparse
+from urllib.parse import urlencode, urlparse
 
 from glass.exception import HTTP404, MethodNotAllow
 
@@ -10,11 +12,29 @@ from ._helpers import current_app as app
 
 RULE_REGEX = re.compile(r"<(?:(?P<converter>[^>:]+):)?(?P<parameter>\w+)>\??")
 
+GROUP_REGEX = re.compile(r"(?<!\\)\(\?P<(?P<name>\w+)>")
+
+# <tenant>.example.com
+HOST_REGEX = re.compile(r"<(?:[^>:]+:)?(?P<parameter>\w+)>\.(?P<parent>.+)")
+
 CONVERTERS_REGEX = {"int": r"\d+", "path": r".+", "str": r"[^/]+"}
 
 # CONVERTERS = {'int': int, 'str': str, 'path': str}
 
 
+def _declared(converter, attr):
+    """Return converter ``attr`` if the class declaring it has the
+    same regex as the converter. A subclass that changes the regex
+    doesn't inherit the fast paths of its base class.
+    """
+    for cls in type(converter).__mro__:
+        if attr in cls.__dict__:
+            if getattr(cls, "regex", None) == converter.regex:
+                return getattr(converter, attr)
+            return None
+    return None
+
+
 class ParamConverter:
     def __init__(self, name, converter):
         self.param_name = name
@@ -23,6 +43,25 @@ class ParamConverter:
         self.converter_name = converter.name
         self.converter = converter
         self.optional = False
+        self.single_segment = bool(_declared(converter, "single_segment"))
+        # used by the route tree to match a path segment
+        self.match_segment = (
+            _declared(converter, "match_segment") or self.c_regex.fullmatch
+        )
+
+    def python_expr(self, arg, converter_arg):
+        """Python expression converting ``arg`` used in
+        :meth:`Rule.compile_converter`, ``converter_arg`` is bound
+        to :meth:`to_python`.
+        """
+        to_python = getattr(type(self.converter), "to_python", None)
+        if to_python is StrConverter.to_python:
+            # the url value is already str
+            return arg
+        if to_python is IntConverter.to_python and not self.optional:
+            # never empty if not optional
+            return "int(%s)" % arg
+        return "%s(%s)" % (converter_arg, arg)
 
     def __call__(self, *args):
         return self.__class__
@@ -37,14 +76,42 @@ class ParamConverter:
         return self.converter.to_url(value)
 
 
+def _shape_param(match):
+    optional = "?" if match.group().endswith("?") else ""
+    return "<%s>%s" % (match.group("converter") or "str", optional)
+
+
+def rule_shape(url_rule):
+    """Url rule without the parameters names, ``/u/<int:id>`` and
+    ``/u/<int:uid>`` match the same paths, both are ``/u/<int>``.
+    """
+    return RULE_REGEX.sub(_shape_param, url_rule)
+
+
 class Rule:
-    def __init__(self, rule, callback=None, methods=None, **kw):
+    def __init__(self, rule, callback=None, methods=None, host=None, **kw):
         self.url_rule = rule
         self.callback = callback
         self.methods = methods or []
         self.converter = {}
         self.params = {}
         self.regex = ""
+        self.builder = None
+        self.convert = None
+        # url rule without the parameters names, set by the router
+        self.shape = None
+        # glass.blueprints.Blueprint the rule is registered on
+        self.blueprint = None
+        self.host = None
+        # subdomain parameter, host="<tenant>.example.com"
+        self.host_param = None
+        if host:
+            match = HOST_REGEX.fullmatch(host)
+            if match:
+                self.host_param = match.group("parameter")
+                self.host = match.group("parent").lower()
+            else:
+                self.host = host.lower()
 
     def __repr__(self):
         return "<Rule %s --> %s, {%s}" % (
@@ -63,47 +130,537 @@ class Rule:
     def __call__(self, **kwargs):
         return self.callback(**kwargs)
 
+    def compile_builder(self):
+        """Split the url rule into literal chunks and parameter
+        slots used by :meth:`build`. ``/u/<id>/<name>?`` becomes
+        ``['/u/', (id, ''), (name, '/')]``, the ``/`` before an
+        optional parameter is only added when the parameter is given.
+        """
+        parts = []
+        pos = 0
+        for match in RULE_REGEX.finditer(self.url_rule):
+            literal = self.url_rule[pos : match.start()]
+            param = self.params[match.group("parameter")]
+            prefix = ""
+            if param.optional and literal.endswith("/"):
+                literal, prefix = literal[:-1], "/"
+            if literal:
+                parts.append(literal)
+            parts.append((param, prefix))
+            pos = match.end()
+        if pos < len(self.url_rule):
+            parts.append(self.url_rule[pos:])
+        self.builder = parts
+
+    def compile_converter(self):
+        """Generate :attr:`convert` function for the rule. It takes the url
+        values in the order of :attr:`params` and returns the view kwargs.
+        ``/u/<int:id>/<name>`` gets
+        ::
+
+           def convert(v0, v1):
+               return {'id': int(v0), 'name': v1}
+        """
+        namespace = {}
+        args = []
+        items = []
+        for pos, (name, param) in enumerate(self.params.items()):
+            arg = "v%d" % pos
+            converter_arg = "c%d" % pos
+            namespace[converter_arg] = param.to_python
+            args.append(arg)
+            items.append("%r: %s" % (name, param.python_expr(arg, converter_arg)))
+        source = "def convert(%s):\n    return {%s}\n" % (
+            ", ".join(args),
+            ", ".join(items),
+        )
+        exec(source, namespace)
+        self.convert = namespace["convert"]
+
+    def sample_path(self):
+        """Return a path matched by the rule, used to find shadowed
+        rules. ``None`` if no sample value fits the converters.
+        """
+        values = {}
+        for name, param in self.params.items():
+            for value in ("x", "0"):
+                if param.c_regex.fullmatch(value):
+                    values[name] = value
+                    break
+            else:
+                return None
+        path = self.build(**values)
+        if not self.regex.match(path):
+            return None
+        return path
+
+    def build_host(self, **kwargs):
+        """Return the host of the rule with the subdomain parameter
+        filled from kwargs, ``None`` if the rule has no host.
+        """
+        if not self.host_param:
+            return self.host
+        try:
+            return "%s.%s" % (kwargs[self.host_param], self.host)
+        except KeyError:
+            raise TypeError(
+                "Rule (%s) missing required parameter %s "
+                % (self.url_rule, self.host_param)
+            )
+
     def build(self, **kwargs):
-        if not self.regex:
+        if self.builder is None:
             raise TypeError
-        out = self.url_rule
-        missing_args = set(self.params) - set(kwargs)
-        if missing_args:
-            for arg in missing_args:
-                p = self.params[arg]
-                if not p.optional:
+        out = []
+        for part in self.builder:
+            if part.__class__ is str:
+                out.append(part)
+                continue
+            param_converter, prefix = part
+            try:
+                value = kwargs[param_converter.param_name]
+            except KeyError:
+                if not param_converter.optional:
                     raise TypeError(
                         "Rule (%s) missing required parameter %s "
-                        % (self.url_rule, arg)
+                        % (self.url_rule, param_converter.param_name)
                     )
-        for _, param_converter in self.params.items():
-            missing = False
+                continue
+            out.append(prefix)
+            out.append(param_converter.to_url(value))
+        return "".join(out)
+
+
+class OptionsRule(Rule):
+    """Rule returned by the router for ``OPTIONS`` request when no view
+    handles ``OPTIONS`` for the url rule. The app answers it with
+    :attr:`allow` as ``Allow`` header without calling any view.
+    """
+
+    def __init__(self, rule, allow):
+        super().__init__(rule.url_rule, None, ["OPTIONS"])
+        self.params = rule.params
+        self.regex = rule.regex
+        self.builder = rule.builder
+        self.convert = rule.convert
+        self.blueprint = rule.blueprint
+        self.allow = allow
+
+
+def _merge_allow(allows):
+    methods = set()
+    for allow in allows:
+        methods.update(method.strip() for method in allow.split(",") if method)
+    return ", ".join(sorted(methods))
+
+
+class RouteMethods:
+    """Rules matching the same paths indexed by HTTP method, the url
+    rules have the same :func:`rule_shape`, only the parameters names
+    may differ.
+
+    ``rule`` is the first registered rule, it is the one
+    stored in the route matchers. ``HEAD`` is served by the
+    ``GET`` view and ``OPTIONS`` by :class:`OptionsRule` unless
+    a view is registered for them.
+    """
+
+    def __init__(self, rule):
+        self.rule = rule
+        self.by_method = {}
+        # (method, rule) registered again for a method, never used
+        self.conflicts = []
+        self.any_method = None
+        self.methods = frozenset()
+        self.allow = ""
+        self.options = None
+        self.add(rule)
+
+    def add(self, rule):
+        if not rule.methods and self.any_method is None:
+            self.any_method = rule
+        for method in rule.methods:
+            if method in self.by_method:
+                self.conflicts.append((method, rule))
+                continue
+            self.by_method[method] = rule
+        methods = set(self.by_method)
+        if "GET" in methods:
+            methods.add("HEAD")
+        methods.add("OPTIONS")
+        self.methods = frozenset(methods)
+        self.allow = ", ".join(sorted(methods))
+        self.options = OptionsRule(self.rule, self.allow)
+
+    def resolve(self, method):
+        """Return the rule for the request method,
+        raise :class:`~glass.exception.MethodNotAllow` if there is none.
+        """
+        rule = self.by_method.get(method)
+        if rule is not None:
+            return rule
+        if self.any_method is not None:
+            return self.any_method
+        if not method:
+            return self.rule
+        if method == "HEAD" and "GET" in self.by_method:
+            return self.by_method["GET"]
+        if method == "OPTIONS":
+            return self.options
+        raise MethodNotAllow(allow=self.allow)
+
+
+class _RouteNode:
+    """A node in :class:`RouteTree`.
+
+    ``static`` maps a literal path segment to the child node,
+    ``dynamic`` maps a converter name to ``(param_converter, node)``,
+    ``leaves`` holds the rules ending at this node and ``fallback``
+    holds the rules whose remaining part can't be matched segment by
+    segment (optional parameters, ``path`` converter, mixed segments ...),
+    these are matched with the rule regex.
+    """
+
+    __slots__ = ("static", "dynamic", "leaves", "fallback", "min_index")
+
+    def __init__(self):
+        self.static = {}
+        self.dynamic = {}
+        self.leaves = []
+        self.fallback = []
+        # index of the first rule registered under this node,
+        # used to skip branches that can't beat the current match.
+        self.min_index = None
+
+
+class RouteTree:
+    """Segment based prefix tree of url rules.
+
+    url rule ``/u/<int:id>/profile/`` is stored as
+    ``'u' -> <int> -> 'profile'``. Static segments are looked up
+    in a dict and converters are only tried on the nodes where
+    they appear, so the cost of :meth:`match` depends on the
+    depth of the path and not on the number of rules.
+
+    Rules keep the priority they have in :class:`Router`,
+    the first registered rule wins.
+    """
+
+    def __init__(self):
+        self.root = _RouteNode()
+        self.size = 0
+
+    def insert(self, rule):
+        index = self.size
+        self.size += 1
+        node = self.root
+        if node.min_index is None:
+            node.min_index = index
+        url = rule.url_rule
+        if not url.startswith("/"):
+            node.fallback.append((index, rule))
+            return
+        slash = url.endswith("/")
+        segments = url[1:].split("/")
+        if slash:
+            segments.pop()
+        nodes = [node]
+        for pos, segment in enumerate(segments):
+            if "<" not in segment:
+                child = node.static.get(segment)
+                if child is None:
+                    child = node.static[segment] = _RouteNode()
+                node = child
+            else:
+                match = RULE_REGEX.fullmatch(segment)
+                param = match and rule.params.get(match.group("parameter"))
+                if not param or not param.single_segment or param.optional:
+                    first = RULE_REGEX.match(segment)
+                    if first and first.group().endswith("?"):
+                        # the / before optional parameter is optional,
+                        # '/a/<b>?' matches '/a', so match it from
+                        # the node before.
+                        node = nodes[max(pos - 1, 0)]
+                    node.fallback.append((index, rule))
+                    return
+                key = param.converter_name
+                if key not in node.dynamic:
+                    node.dynamic[key] = (param, _RouteNode())
+                node = node.dynamic[key][1]
+            if node.min_index is None:
+                node.min_index = index
+            nodes.append(node)
+        node.leaves.append((index, rule, slash))
+
+    def match(self, path):
+        """Return ``(rule, values)`` of the first registered rule
+        that matches ``path`` or ``None``. ``values`` are the url
+        values in the order of ``rule.params``, not converted.
+        """
+        if path.startswith("/"):
+            parts = path[1:].split("/")
+        elif not path:
+            parts = []
+        else:
+            parts = None
+        best = self._search(self.root, parts, 0, [], path, None)
+        if best is None:
+            return None
+        return best[1], best[2]
+
+    def _search(self, node, parts, pos, values, path, best):
+        for index, rule in node.fallback:
+            if best is not None and index >= best[0]:
+                break
+            match = rule.regex.match(path)
+            if match:
+                best = (index, rule, [match.group(name) for name in rule.params])
+                break
+        if parts is None:
+            return best
+        size = len(parts)
+        if pos == size or (pos == size - 1 and not parts[pos]):
+            # end of path or the path ends with /
+            end_slash = pos != size
+            for index, rule, slash in node.leaves:
+                if best is not None and index >= best[0]:
+                    break
+                if slash or not end_slash:
+                    best = (index, rule, list(values))
+                    break
+        if pos == size:
+            return best
+        segment = parts[pos]
+        child = node.static.get(segment)
+        if child is not None and (best is None or child.min_index < best[0]):
+            best = self._search(child, parts, pos + 1, values, path, best)
+        for param, child in node.dynamic.values():
+            if best is not None and child.min_index >= best[0]:
+                continue
+            if param.match_segment(segment):
+                values.append(segment)
+                best = self._search(child, parts, pos + 1, values, path, best)
+                values.pop()
+        return best
+
+
+class CombinedRegex:
+    """The rules regex joined in named alternations
+    ``(?P<r0>...)|(?P<r1>...)|...``.
+
+    A single alternation of all the rules is scanned from the start
+    for each request, slower than the per-rule loop on large tables.
+    The rules are grouped by their static prefix instead, the segments
+    before the first parameter. The group of ``/api/users`` has the rules
+    with the prefix ``/api/users``, ``/api`` and ``/``, in registration
+    order. The deepest prefix of the path found in the groups selects
+    the group and a single ``re.match`` of the group finds the rule,
+    the winning rule is ``match.lastgroup``.
+    The parameters groups are renamed ``r<index>_<name>`` so they
+    don't collide. Groups of more than :attr:`max_group` rules, where
+    the alternation is slower than the loop, match rule by rule.
+    The regexes are rebuilt on the next :meth:`match` after :meth:`insert`.
+    """
+
+    max_group = 64
+
+    def __init__(self):
+        self.rules = []
+        self._built = False
+        # static prefix "api/users" -> (regex, groups)
+        self._groups = {}
+
+    def insert(self, rule):
+        self.rules.append(rule)
+        self._built = False
+
+    @staticmethod
+    def _prefix(url_rule):
+        prefix = []
+        for segment in url_rule[1:].split("/"):
+            if "<" in segment:
+                break
+            prefix.append(segment)
+        while prefix and not prefix[-1]:
+            prefix.pop()
+        return prefix
+
+    def _compile(self, rules):
+        if not rules:
+            return None, {}
+        if len(rules) > self.max_group:
+            return None, [rule for _, rule in rules]
+        alternatives = []
+        groups = {}
+        for index, rule in rules:
+            name = "r%d" % index
+            params = []
+
+            def rename(match):
+                group = "%s_%s" % (name, match.group("name"))
+                if match.group("name") in rule.params:
+                    params.append(group)
+                return "(?P<%s>" % group
+
+            pattern = rule.regex.pattern
+            if pattern.startswith("^"):
+                pattern = pattern[1:]
+            pattern = GROUP_REGEX.sub(rename, pattern)
+            alternatives.append("(?P<%s>%s)" % (name, pattern))
+            groups[name] = (rule, params)
+        return re.compile("|".join(alternatives)), groups
+
+    def build(self):
+        by_prefix = {"": []}
+        for index, rule in enumerate(self.rules):
+            prefix = self._prefix(rule.url_rule)
+            # the parent prefixes are needed to walk down to this one
+            for depth in range(1, len(prefix)):
+                by_prefix.setdefault("/".join(prefix[:depth]), [])
+            by_prefix.setdefault("/".join(prefix), []).append((index, rule))
+        groups = {}
+        for key in by_prefix:
+            rules = list(by_prefix[""])
+            if key:
+                parts = key.split("/")
+                for depth in range(1, len(parts) + 1):
+                    rules.extend(by_prefix["/".join(parts[:depth])])
+            rules.sort(key=lambda item: item[0])
+            groups[key] = self._compile(rules)
+        self._groups = groups
+        self._built = True
+
+    def match(self, path):
+        """Return ``(rule, values)`` of the first registered rule
+        that matches ``path`` or ``None``, see :meth:`RouteTree.match`.
+        """
+        if not self._built:
+            self.build()
+        groups = self._groups
+        regex, params = groups[""]
+        end = 0
+        while end != -1:
+            end = path.find("/", end + 1)
+            group = groups.get(path[1:end] if end != -1 else path[1:])
+            if group is None:
+                break
+            regex, params = group
+        if regex is None:
+            # empty or large group
+            for rule in params:
+                match = rule.regex.match(path)
+                if match:
+                    return rule, [match.group(name) for name in rule.params]
+            return None
+        match = regex.match(path)
+        if not match:
+            return None
+        rule, groups = params[match.lastgroup]
+        return rule, [match.group(group) for group in groups]
+
+
+class RouteCache:
+    """Bounded LRU cache of matched routes.
+
+    Keys are ``(path, method)``, values are ``(rule, kwargs)``
+    with the converted kwargs, so dynamic routes are cached too.
+    The least recently used entry is dropped once ``maxsize``
+    is reached. ``maxsize`` of 0 disables the cache.
+    """
+
+    def __init__(self, maxsize=1024):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._data = OrderedDict()
+
+    def get(self, key):
+        try:
+            value = self._data[key]
+        except KeyError:
+            self.misses += 1
+            return None
+        try:
+            self._data.move_to_end(key)
+        except KeyError:
+            # removed by another thread
+            pass
+        self.hits += 1
+        return value
+
+    def set(self, key, value):
+        if not self.maxsize or self.maxsize <= 0:
+            return
+        self._data[key] = value
+        while len(self._data) > self.maxsize:
             try:
-                value = kwargs.pop(param_converter.param_name)
-                value = param_converter.to_url(value)
+                self._data.popitem(last=False)
             except KeyError:
-                missing = True
-                value = ""
-
-            # if not param_converter.c_regex.match(value):
-            #    pass
-            sub = "<(%s:)?%s>" % (
-                param_converter.converter_name,
-                param_converter.param_name,
-            )
-            if param_converter.optional:
-                sub += r"\?"
-            if missing:
-                sub = "/" + sub
-            pattern = re.compile(sub)
-            out = pattern.sub(value, out)
-        return out
+                break
+
+    def clear(self):
+        """Invalidate all the cached routes"""
+        self._data.clear()
+
+    def info(self):
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "size": len(self._data),
+            "maxsize": self.maxsize,
+        }
+
+    def __len__(self):
+        return len(self._data)
 
 
 class Router:
-    def __init__(self, app=None):
+    def __init__(self, app=None, matcher=None, cache_size=None):
+        self.app = app
         self.rules = []
-        self._url_caches = {}
+        self.tree = RouteTree()
+        self.combined = CombinedRegex()
+        self.matchers = {"tree": self.tree, "regex": self.combined}
+        self._matcher = matcher
+        self._cache_size = cache_size
+        self.cache = RouteCache()
+        # rule_shape(url rule) -> RouteMethods
+        self.routes = {}
+        # host -> Router, rules with host="api.example.com"
+        self.hosts = {}
+        # parent host -> Router, rules with host="<sub>.example.com"
+        self.subdomains = {}
+        # url prefix -> Router, see mount()
+        self.mounts = {}
+        self._mount_depths = []
+        self.frozen = False
+        # matcher.match, set by freeze()
+        self._find = None
+
+    @property
+    def matcher(self):
+        """Name of the matcher used by :meth:`match`,
+        ``tree`` (default) or ``regex``.
+        Set with ``ROUTE_MATCHER`` config.
+        """
+        if self._matcher:
+            return self._matcher
+        if self.app is not None:
+            return self.app.config["ROUTE_MATCHER"] or "tree"
+        return "tree"
+
+    @property
+    def cache_size(self):
+        """Maximum number of routes kept in :attr:`cache`,
+        ``ROUTE_CACHE_SIZE`` config.
+        """
+        if self._cache_size is not None:
+            return self._cache_size
+        if self.app is not None:
+            size = self.app.config["ROUTE_CACHE_SIZE"]
+            if size is not None:
+                return int(size)
+        return 1024
 
     def compile(self, rule):
         """compile url rule to regex
@@ -163,32 +720,206 @@ class Router:
 
     def add(self, rule):
         """add new url rule"""
+        if self.frozen:
+            raise RuntimeError(
+                "Can't add rule %s, the route table is frozen" % rule.url_rule
+            )
+        if rule.host:
+            tables = self.subdomains if rule.host_param else self.hosts
+            table = tables.get(rule.host)
+            if table is None:
+                table = tables[rule.host] = Router(
+                    self.app, matcher=self._matcher, cache_size=self._cache_size
+                )
+            table._add(rule)
+            return
+        self._add(rule)
+
+    def _add(self, rule):
         regex, params = self.compile(rule.url_rule)
         # rule.converter = dict((k, v.func) for k, v in params.items())
         regex = re.compile(regex)
         rule.regex = regex
         rule.params = params
+        rule.compile_builder()
+        rule.compile_converter()
         self.rules.append((rule, regex))
+        self.cache.clear()
+        rule.shape = rule_shape(rule.url_rule)
+        route = self.routes.get(rule.shape)
+        if route is not None:
+            # same paths, other methods
+            route.add(rule)
+            return
+        self.routes[rule.shape] = RouteMethods(rule)
+        self.tree.insert(rule)
+        self.combined.insert(rule)
 
     def match(self, environ):
-        path = environ["PATH_INFO"]
-        rule, view_kwargs = self._url_caches.get(path, (None, None))
-        if rule:
-            return rule, view_kwargs
-        for rule, regex in self.rules:
-            match = regex.match(path)
-            if match:
-                kwargs = match.groupdict()
-                kwargs = self.apply_converter(kwargs, rule)
-                if not kwargs:
-                    # static url rule,
-                    # example: /login/,/user/reset/ ...
-                    # cache it to avoid searching next time
-                    self._url_caches[path] = (rule, kwargs)
-
-                return rule, kwargs
+        if not (self.hosts or self.subdomains or self.mounts):
+            return self._match(environ)
+        # the host table, the mounted table then the rules registered
+        # on this router, the first one with a rule for the method wins
+        allow = []
+        options = None
+        for table, subdomain in self._candidate_tables(environ):
+            try:
+                if table is self:
+                    rule, kwargs = self._match(environ)
+                else:
+                    rule, kwargs = table.match(environ)
+            except HTTP404:
+                continue
+            except MethodNotAllow as exc:
+                # same path, other methods, e.g. GET on the app
+                # and POST on a blueprint
+                allow.append(exc.allow)
+                continue
+            if rule.host_param:
+                kwargs[rule.host_param] = subdomain
+            if rule.__class__ is OptionsRule:
+                allow.append(rule.allow)
+                if options is None:
+                    options = rule, kwargs
+                continue
+            return rule, kwargs
+        if options is not None:
+            rule, kwargs = options
+            if len(allow) > 1:
+                rule = OptionsRule(rule, _merge_allow(allow))
+            return rule, kwargs
+        if allow:
+            raise MethodNotAllow(allow=_merge_allow(allow))
         raise HTTP404()
 
+    def _candidate_tables(self, environ):
+        if self.hosts or self.subdomains:
+            table, subdomain = self._host_table(environ.get("HTTP_HOST", ""))
+            if table is not None:
+                yield table, subdomain
+        if self.mounts:
+            table = self._mount_table(environ["PATH_INFO"])
+            if table is not None:
+                yield table, None
+        yield self, None
+
+    def mount(self, prefix, router):
+        """Match paths starting with ``prefix`` with ``router``
+        before the rules of this router. Only the router of the
+        matching prefix is searched.
+        """
+        if self.frozen:
+            raise RuntimeError("Can't mount %s, the route table is frozen" % prefix)
+        prefix = prefix.rstrip("/")
+        self.mounts[prefix] = router
+        self._mount_depths = sorted(
+            {p.count("/") for p in self.mounts}, reverse=True
+        )
+        self.clear_cache()
+
+    def _mount_table(self, path):
+        for depth in self._mount_depths:
+            prefix = "/".join(path.split("/", depth + 1)[: depth + 1])
+            table = self.mounts.get(prefix)
+            if table is not None:
+                return table
+        return None
+
+    def _host_table(self, host):
+        """Return the route table for the request host and the subdomain"""
+        host = host.lower()
+        table = self.hosts.get(host)
+        if table is None:
+            name, sep, port = host.rpartition(":")
+            if sep and port.isdigit():
+                host = name
+                table = self.hosts.get(host)
+        if table is not None:
+            return table, None
+        subdomain, _, parent = host.partition(".")
+        return self.subdomains.get(parent), subdomain
+
+    def _match(self, environ):
+        path = environ["PATH_INFO"]
+        method = environ.get("REQUEST_METHOD", "")
+        key = (path, method)
+        cached = self.cache.get(key)
+        if cached is not None:
+            rule, kwargs = cached
+            return rule, dict(kwargs)
+        find = self._find
+        if find is None:
+            # not frozen, config may change
+            find = self._get_matcher().match
+            self.cache.maxsize = self.cache_size
+        found = find(path)
+        if found is None:
+            raise HTTP404()
+        rule, values = found
+        rule = self.routes[rule.shape].resolve(method)
+        kwargs = rule.convert(*values)
+        self.cache.set(key, (rule, dict(kwargs)))
+        return rule, kwargs
+
+    def _get_matcher(self):
+        try:
+            return self.matchers[self.matcher]
+        except KeyError:
+            raise ValueError("unknown route matcher %s" % self.matcher)
+
+    def _tables(self):
+        """Host and mounted routers"""
+        yield from self.hosts.values()
+        yield from self.subdomains.values()
+        yield from self.mounts.values()
+
+    def validate(self):
+        """Return list of problems found in the route table,
+        rules registered twice for the same method and rules
+        shadowed by a rule registered before them.
+        """
+        problems = []
+        matcher = self._get_matcher()
+        for route in self.routes.values():
+            for method, rule in route.conflicts:
+                problems.append(
+                    "Rule %s (%s) %s is never used, %s is registered for %s"
+                    % (
+                        rule.url_rule,
+                        method,
+                        rule.callback,
+                        route.by_method[method].callback,
+                        method,
+                    )
+                )
+            path = route.rule.sample_path()
+            if path is None:
+                continue
+            found = matcher.match(path)
+            if found is not None and found[0] is not route.rule:
+                problems.append(
+                    "Rule %s is shadowed by %s registered before it (%s)"
+                    % (route.rule.url_rule, found[0].url_rule, path)
+                )
+        for table in self._tables():
+            problems.extend(table.validate())
+        return problems
+
+    def freeze(self):
+        """Build the matcher selected by config once and make the
+        route table immutable. After this, :meth:`match` does not
+        read config or rebuild anything.
+        """
+        matcher = self._get_matcher()
+        if hasattr(matcher, "build"):
+            matcher.build()
+        self.cache.maxsize = self.cache_size
+        self.cache.clear()
+        self._find = matcher.match
+        self.frozen = True
+        for table in self._tables():
+            table.freeze()
+
     def apply_converter(self, view_kwargs, rule):
         """apply converter to url rule
         if the url rule == '/<str:user>/<int:user_id>'
@@ -216,9 +947,17 @@ class Router:
             raise ValueError("bad re syntax %s" % regex)
         CONVERTERS_REGEX[name] = regex
         CONVERTERS[name] = func
+        self.clear_cache()
 
     def use_converter(self, converter):
         CONVERTERS[converter.name] = converter
+        self.clear_cache()
+
+    def clear_cache(self):
+        """Clear the routes cache of this router and the host tables"""
+        self.cache.clear()
+        for table in self._tables():
+            table.clear_cache()
 
 
 def url_for(view_name, **kwargs):
@@ -268,35 +1007,58 @@ def url_for(view_name, **kwargs):
     if not rule:
         raise LookupError('Endpoint with view name "%s" not found' % view_name)
     path = rule.build(**kwargs)
+    host = rule.build_host(**kwargs)
     for param in rule.params:
         kwargs.pop(param, None)
-    server_name = app.config["SERVER_NAME"]
-    if server_name is None:
-        server_name = ""
+    if rule.host_param:
+        kwargs.pop(rule.host_param, None)
     fragment = kwargs.pop("_fragment", "")
     if not fragment:
         fragment = kwargs.pop("_target", "")
     scheme = kwargs.pop("_scheme", "")
+    server_scheme, netloc = _split_server_name(app.config["SERVER_NAME"] or "")
+    if host:
+        # rule bound to a host, always absolute url
+        netloc = host
+    url = urlquote(path)
+    if netloc:
+        scheme = scheme or server_scheme or "http"
+        if url and not url.startswith("/"):
+            url = "/" + url
+        url = "%s://%s%s" % (scheme, netloc, url)
+    if kwargs:
+        url = url + "?" + urlencode(kwargs)
+    if fragment:
+        url = url + "#" + fragment
+    return url
+
+
+@functools.lru_cache(maxsize=32)
+def _split_server_name(server_name):
+    """Return ``(scheme, netloc)`` of ``SERVER_NAME`` config.
+    Cached, so the value is only parsed when the config changes.
+    """
     uri = urlparse(server_name)
     netloc = uri.netloc
-    scheme = scheme or uri.scheme or "http"
     if not netloc and uri.path:
         if not uri.path.startswith("/"):
             # /www.domain.com is consider as path
             netloc = uri.path[:-1] if uri.path.endswith("/") else uri.path
         # urlparse('www.domain.com')
         # urllib parse this as path and not netloc
-    if not netloc and scheme:
-        scheme = ""
-    query_string = urlencode(kwargs)
-    url = urlunparse((scheme, netloc, urlquote(path), "", query_string, fragment))
-    return url
+    return uri.scheme, netloc
 
 
 class BaseCoverter:
 
     regex = ""
     name = ""
+    # True if the regex never matches "/", the router can then
+    # match the converter against a single path segment.
+    single_segment = False
+    # optional function matching a path segment without regex,
+    # same result as the regex fullmatch
+    match_segment = None
 
     def to_url(self, value):
         return NotImplemented
@@ -308,6 +1070,11 @@ class BaseCoverter:
 class StrConverter(BaseCoverter):
     regex = r"[^/]+"
     name = "str"
+    single_segment = True
+
+    @staticmethod
+    def match_segment(value):
+        return bool(value) and "/" not in value
 
     def to_url(self, value):
         return str(value)
@@ -319,6 +1086,9 @@ class StrConverter(BaseCoverter):
 class IntConverter(BaseCoverter):
     regex = r"\d+"
     name = "int"
+    single_segment = True
+    # same as \d+, unicode decimal digits
+    match_segment = staticmethod(str.isdecimal)
 
     def to_url(self, value):
         return str(value)
@@ -332,6 +1102,8 @@ class IntConverter(BaseCoverter):
 class PathConverter(StrConverter):
     regex = r".+"
     name = "path"
+    single_segment = False
+    match_segment = None
 
 
 CONVERTERS = {
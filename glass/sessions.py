@@ -1,13 +1,26 @@
+import atexit
 import base64
+import collections
+import contextlib
+import datetime
 import email.utils
+import functools
 import hashlib
+import hmac
+import json
 import logging
-import pickle
+import mmap
+import os
+import sqlite3
+import struct
+import threading
 import time
+import uuid
+import zlib
 
 from glass._helpers import current_app as app
 from glass.requests import request
-from glass.utils import _thread_local
+from glass.utils import _context_property
 
 from .utils import get_random
 
@@ -16,6 +29,11 @@ try:
 except ImportError:
     redis = None
 
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
 log = logger = logging.getLogger("glass.app")
 
 
@@ -48,9 +66,93 @@ def _get_session_cookie_config():
     return cookie_config
 
 
-def encode_session(data, key=b"session-key"):
+class TaggedJSONSerializer:
+    """Serialize session data as compact JSON.
+    ``tuple``, ``bytes``, ``set``, ``datetime``, ``date`` and ``UUID`` values
+    are tagged so they are loaded back with the same type.
+    Dictionary keys must be ``str``.
+
+    Set ``SessionManager.serializer`` to use another serializer, it must
+    have ``dumps(data) -> bytes`` and ``loads(bytes)`` methods.
+    """
+
+    def __init__(self):
+        self._encode = json.JSONEncoder(
+            ensure_ascii=False, separators=(",", ":")
+        ).encode
+        self._decoder = json.JSONDecoder(object_hook=self._untag)
+        self.tags = {
+            " t": tuple,
+            " b": base64.b64decode,
+            " s": set,
+            " d": datetime.datetime.fromisoformat,
+            " dd": datetime.date.fromisoformat,
+            " u": uuid.UUID,
+            " di": dict,
+        }
+
+    def _tag(self, value):
+        if value is None or isinstance(value, (str, int, float)):
+            return value
+        if isinstance(value, dict):
+            value = {key: self._tag(item) for key, item in value.items()}
+            if len(value) == 1 and next(iter(value)) in self.tags:
+                # would be loaded as tagged value
+                return {" di": list(value.items())}
+            return value
+        if isinstance(value, list):
+            return [self._tag(item) for item in value]
+        if isinstance(value, tuple):
+            return {" t": [self._tag(item) for item in value]}
+        if isinstance(value, bytes):
+            return {" b": base64.b64encode(value).decode("ascii")}
+        if isinstance(value, (set, frozenset)):
+            return {" s": [self._tag(item) for item in value]}
+        if isinstance(value, datetime.datetime):
+            return {" d": value.isoformat()}
+        if isinstance(value, datetime.date):
+            return {" dd": value.isoformat()}
+        if isinstance(value, uuid.UUID):
+            return {" u": value.hex}
+        raise TypeError(
+            "Object of type %s can't be stored in session" % type(value).__name__
+        )
+
+    def _untag(self, obj):
+        if len(obj) == 1:
+            key, value = next(iter(obj.items()))
+            func = self.tags.get(key)
+            if func is not None:
+                return func(value)
+        return obj
+
+    def dumps(self, data):
+        return self._encode(self._tag(data)).encode("utf-8")
+
+    def loads(self, data):
+        return self._decoder.decode(data.decode("utf-8"))
+
+
+serializer = TaggedJSONSerializer()
+
+
+@functools.lru_cache(maxsize=8)
+def _signing_key(key):
+    return hashlib.sha256(b"glass.session-signing-key" + key.encode()).digest()
+
+
+def _sign(key, value):
+    mac = hmac.new(_signing_key(key), value, hashlib.sha256).digest()
+    return base64.urlsafe_b64encode(mac).rstrip(b"=")
+
+
+def encode_session(data, key="session-key", serializer=serializer, compress=None):
     """Encode current session data and sign it.
     This generate string to be used as cookie
+    ``<payload>.<timestamp>.<signature>``, the payload is compressed
+    with ``zlib`` if it is larger than ``compress`` bytes
+    (``SESSION_COMPRESS_THRESHOLD`` config), the signature is
+    ``HMAC-SHA256`` of the payload and timestamp.
 
     :param data: ``dict``, current session data
     :param key: ``str``, app.secret-key
@@ -62,30 +164,79 @@ def encode_session(data, key=b"session-key"):
         log.warning(
             "You used session without secret key set" " consider setting secret key"
         )
-    key = key.encode()
-    data = base64.b64encode(pickle.dumps(data))
-    hash_value = hashlib.sha1(data + key).hexdigest()
-    hash_value = hash_value[10:30]
-    return "%s.%s" % (hash_value, data.decode())
-
-
-def decode_session(string, key="session-key"):
+    if compress is None:
+        compress = app.config["SESSION_COMPRESS_THRESHOLD"]
+    payload = serializer.dumps(data)
+    flag = b"j"
+    if compress is not None and len(payload) > compress:
+        compressed = zlib.compress(payload, 6)
+        if len(compressed) < len(payload):
+            payload = compressed
+            flag = b"z"
+    value = b"%s%s.%x" % (
+        flag,
+        base64.urlsafe_b64encode(payload).rstrip(b"="),
+        int(time.time()),
+    )
+    return (value + b"." + _sign(key, value)).decode("ascii")
+
+
+def decode_session(string, key="session-key", max_age=None, serializer=serializer):
     """Get current session data from session cookie.
-    Returns empty dict if there is no cookie or
-    the cookie verification failed.
+    Returns ``None`` if the cookie verification failed or the
+    cookie is older than ``max_age`` seconds.
     """
-    # key = app.config['SECRETE_KEY'] or key
-    key = key.encode()
+    return _decode_session(string, key, max_age, serializer)[0]
+
+
+def _decode_session(string, key, max_age, serializer):
+    # returns (data, timestamp)
     try:
-        hash_value, data = string.split(".", 1)
-    except ValueError:
-        return None
-    real_hash = hashlib.sha1(data.encode() + key).hexdigest()[10:30]
-    if real_hash != hash_value:
+        value, signature = string.encode("ascii").rsplit(b".", 1)
+        payload, timestamp = value.rsplit(b".", 1)
+        timestamp = int(timestamp, 16)
+    except (UnicodeError, ValueError):
+        return None, None
+    if not hmac.compare_digest(signature, _sign(key, value)):
         # the cookie has been tampered with
+        return None, None
+    if max_age and time.time() - timestamp > int(max_age):
+        return None, None
+    flag, payload = payload[:1], payload[1:]
+    try:
+        payload = base64.urlsafe_b64decode(payload + b"=" * (-len(payload) % 4))
+        if flag == b"z":
+            payload = zlib.decompress(payload)
+        data = serializer.loads(payload)
+    except (ValueError, TypeError, zlib.error):
+        return None, None
+    if not isinstance(data, dict):
+        return None, None
+    return data, timestamp
+
+
+def _session_lifetime():
+    config = app.config
+    lifetime = config["SESSION_COOKIE_MAXAGE"] or config["SESSION_COOKIE_EXPIRE"]
+    try:
+        return int(lifetime) if lifetime else None
+    except ValueError:
         return None
-    data = base64.b64decode(data)
-    return pickle.loads(data)
+
+
+def needs_refresh(issued):
+    """``True`` if the cookie issued at ``issued`` should be sent again
+    to refresh its ``Max-Age``/``Expires``, after
+    ``SESSION_REFRESH_FRACTION`` of the cookie lifetime.
+    """
+    lifetime = _session_lifetime()
+    if not lifetime or issued is None:
+        # browser session cookie, nothing to refresh
+        return False
+    fraction = app.config["SESSION_REFRESH_FRACTION"]
+    if fraction is None:
+        fraction = 0.5
+    return time.time() - issued >= lifetime * fraction
 
 
 class Session(dict):
@@ -98,12 +249,90 @@ class Session(dict):
         session['name'] = 'username'
     """
 
-    session_data = _thread_local()
-    modified = _thread_local()
+    _data = _context_property("session_data")
+    _manager = _context_property("session_manager")
+    _modified = _context_property("session_modified")
+    #: time the session cookie was issued, ``None`` for new session
+    issued = _context_property("session_issued")
+    #: ``True`` once the response headers, with the session
+    #: cookie, are built
+    saved = _context_property("session_saved")
+    #: flashed messages taken out of the session, see :meth:`take_flashes`
+    flashes = _context_property("session_flashes")
 
     def __init__(self, data=None):
         self.data = data
-        self.modified = False
+
+    @property
+    def session_data(self):
+        """Current session data, loaded with the session manager
+        ``open()`` on first access.
+        """
+        try:
+            return self._data
+        except RuntimeError:
+            manager = self._manager
+            if manager is None:
+                raise
+        self._manager = None
+        manager.open()
+        return self._data
+
+    @session_data.setter
+    def session_data(self, data):
+        self._data = data
+
+    @property
+    def modified(self):
+        """``True`` if the session must be saved. Set it after changing
+        a value of the session in place, ``session['cart'].append(item)``.
+        """
+        return self._modified
+
+    @modified.setter
+    def modified(self, value):
+        if value and self.saved:
+            raise RuntimeError(
+                "The session was saved before the response body was sent, "
+                "it can't be modified in a streaming response"
+            )
+        self._modified = value
+
+    @property
+    def loaded(self):
+        """``True`` if the session was used in the current request"""
+        try:
+            self._data
+        except RuntimeError:
+            return False
+        return True
+
+    def take_flashes(self):
+        """Move the flashed messages out of the session to the request
+        context before the session is saved. Streaming response generators
+        run after the session is saved, the flashed messages are read there
+        without modifying the session.
+        """
+        try:
+            if not self.loaded:
+                name = app.config["SESSION_COOKIE_NAME"]
+                if not request.cookies.get(name):
+                    # no session, no flashed messages
+                    return
+            flashes = self.get("__flash__")
+        except RuntimeError:
+            # outside of request
+            return
+        if flashes:
+            self.pop("__flash__")
+            self.flashes = flashes
+
+    def open_lazy(self, manager):
+        """Open the session with ``manager.open()`` when it is first
+        used in the current request. Requests that never use the
+        session don't read the session cookie.
+        """
+        self._manager = manager
 
     def get(self, key, default=None):
         """Get session data with its key,
@@ -126,8 +355,9 @@ class Session(dict):
 
            session['name'] = 'username'
         """
+        data = self.session_data
         self.modified = True
-        self.session_data[key] = value
+        data[key] = value
 
     def __getitem__(self, key):
 
@@ -139,9 +369,10 @@ class Session(dict):
     def __iter__(self):
         return iter(self.session_data)
 
-    def bind(self, data):
+    def bind(self, data, issued=None):
         self.session_data = data
         self.modified = False
+        self.issued = issued
 
     def __len__(self):
         return len(self.session_data)
@@ -163,14 +394,14 @@ class Session(dict):
                # session.pop('name')
                return 'hello'
         """
+        data = self.session_data
         self.modified = True
         try:
-            return self.session_data.pop(key)
+            return data.pop(key)
         except KeyError:
             return default
 
     def __delitem__(self, item):
-        self.modified = True
         self.pop(item)
 
     def clear(self):
@@ -182,89 +413,594 @@ class Session(dict):
                 session.clear()
                 return 'hello'
         """
+        data = self.session_data
         self.modified = True
-        self.session_data.clear()
+        data.clear()
 
 
 class SessionManager:
+    """Store session data in signed cookie"""
+
     salt = "session-salt-"
+    serializer = serializer
 
     def open(self):
         key = app.config["SECRET_KEY"]
         name = app.config["SESSION_COOKIE_NAME"]
         cookie = request.cookies.get(name)
-        data = {}
         if cookie:
-            data = decode_session(cookie, key) or {}
-        session.bind(data)
+            max_age = app.config["SESSION_COOKIE_MAXAGE"]
+            data, issued = _decode_session(cookie, key, max_age, self.serializer)
+            if data is not None:
+                session.bind(data, issued)
+                return
+        session.bind({})
 
     def save(self, response=None):
-        # TODO: add Secure and SameSite
+        data = session.session_data
+        if not session.modified:
+            if not data or not needs_refresh(session.issued):
+                # the browser has the same cookie
+                return
         key = app.config["SECRET_KEY"]
         cookie_config = _get_session_cookie_config()
-        data = session.session_data
         name = app.config["SESSION_COOKIE_NAME"]
         if not data:
-            if not session.modified:
-                return
             # TODO: add path,domain to delete_cookie
             response.delete_cookie(name, **cookie_config)
             return
-        cookie = encode_session(data, key)
+        cookie = encode_session(data, key, self.serializer)
         response.set_cookie(name, cookie, **cookie_config)
 
 
-class RedisSessionManager:
-    def __init__(self, host="", port=6379, db=1):
-        if redis is None:
-            raise ImportError("redis module is not installed")
-        self._redis = redis.Redis(host=host, port=port, db=db)
+class ServerSessionManager:
+    """Base class of session managers storing the session data on the
+    server, the cookie only has the session id.
+    Subclasses implement :meth:`load`, :meth:`store`, :meth:`delete`
+    and :meth:`touch`.
+    """
+
+    serializer = serializer
+
+    def load(self, sid):
+        """Returns the serialized session data of ``sid`` or ``None``"""
+        raise NotImplementedError
+
+    def store(self, sid, value, expire):
+        """Store serialized session data for ``expire`` seconds"""
+        raise NotImplementedError
+
+    def delete(self, sid):
+        raise NotImplementedError
+
+    def touch(self, sid, expire):
+        """Extend the session for ``expire`` seconds"""
+        raise NotImplementedError
 
     def open(self):
-        key = app.config["SECRET_KEY"]
         name = app.config["SESSION_COOKIE_NAME"]
         cookie = request.cookies.get(name)
         data = {}
+        issued = None
         if cookie:
-            redis_data = self._redis.get(cookie)
-            if redis_data:
+            sid, issued = _split_session_cookie(cookie)
+            stored = self.load(sid)
+            if stored:
                 try:
-                    data = pickle.loads(redis_data)
-                except pickle.PickleError as e:
+                    data = self.serializer.loads(stored)
+                except (ValueError, TypeError) as e:
                     logger.info("Failed to loads session data %s", e)
                     data = {}
             else:
-                print("sent cookie not found in redis")
-        session.bind(data)
+                issued = None
+        session.bind(data, issued)
 
     def save(self, response=None):
-        key = app.config["SECRET_KEY"]
-        cookie_config = _get_session_cookie_config()
         data = session.session_data
+        cookie_config = _get_session_cookie_config()
         name = app.config["SESSION_COOKIE_NAME"]
-        previous_cookie = request.cookies.get(name)
+        sid = None
+        cookie = request.cookies.get(name)
+        if cookie:
+            sid = _split_session_cookie(cookie)[0]
+        expire = _session_lifetime() or 60 * 60 * 24 * 30
+        if not session.modified:
+            if data and sid and needs_refresh(session.issued):
+                # extend the session without sending the data again
+                self.touch(sid, expire)
+                response.set_cookie(name, _session_cookie(sid), **cookie_config)
+            return
         if not data:
-            if not session.modified:
-                return
             # TODO: add path,domain to delete_cookie
             response.delete_cookie(name, **cookie_config)
-            self._redis.delete(previous_cookie)
+            if sid:
+                self.delete(sid)
             return
-        if not session.modified:
-            response.set_cookie(name, previous_cookie, **cookie_config)
+        if session.issued is None:
+            # new session, don't use the id sent by the client
+            sid = get_random(35)
+        self.store(sid, self.serializer.dumps(data), expire)
+        response.set_cookie(name, _session_cookie(sid), **cookie_config)
+
+
+class RedisSessionManager(ServerSessionManager):
+    """Store session data in redis.
+    ::
+
+        app.session_cls = RedisSessionManager(
+            host='localhost', port=6379, db=1, max_connections=8, cache_ttl=2
+        )
+
+    :param max_connections: size of the redis connection pool, set it to the
+        number of worker threads.
+    :param client: redis client to use instead of creating one, any object
+        with ``get``, ``set``, ``expire`` and ``delete`` methods.
+    :param prefix: prefix of the redis keys.
+    :param cache_ttl: keep session data read from redis in process for
+        ``cache_ttl`` seconds, requests in burst from the same user
+        don't read redis again. ``0`` disables the cache.
+    :param cache_size: maximum number of sessions in the cache.
+    """
+
+    def __init__(
+        self,
+        host="",
+        port=6379,
+        db=1,
+        max_connections=None,
+        client=None,
+        prefix="",
+        cache_ttl=0,
+        cache_size=1024,
+        **kwargs
+    ):
+        if client is None:
+            if redis is None:
+                raise ImportError("redis module is not installed")
+            pool = redis.ConnectionPool(
+                host=host, port=port, db=db, max_connections=max_connections, **kwargs
+            )
+            client = redis.Redis(connection_pool=pool)
+        self._redis = client
+        self.prefix = prefix
+        self.cache_ttl = cache_ttl
+        self.cache_size = cache_size
+        self._cache = {}
+        self._cache_lock = threading.Lock()
+
+    def _cache_get(self, sid):
+        entry = self._cache.get(sid)
+        if entry is not None:
+            if entry[0] > time.monotonic():
+                return entry[1]
+            self._cache.pop(sid, None)
+        return None
+
+    def _cache_set(self, sid, value):
+        with self._cache_lock:
+            if sid not in self._cache and len(self._cache) >= self.cache_size:
+                # drop the oldest entry
+                del self._cache[next(iter(self._cache))]
+            self._cache[sid] = (time.monotonic() + self.cache_ttl, value)
+
+    def load(self, sid):
+        if self.cache_ttl:
+            value = self._cache_get(sid)
+            if value is not None:
+                return value
+        value = self._redis.get(self.prefix + sid)
+        if value and self.cache_ttl:
+            self._cache_set(sid, value)
+        return value
+
+    def store(self, sid, value, expire):
+        # SET with EX, one command
+        self._redis.set(self.prefix + sid, value, ex=expire)
+        if self.cache_ttl:
+            self._cache_set(sid, value)
+
+    def delete(self, sid):
+        self._redis.delete(self.prefix + sid)
+        self._cache.pop(sid, None)
+
+    def touch(self, sid, expire):
+        self._redis.expire(self.prefix + sid, expire)
+
+
+class MemorySessionManager(ServerSessionManager):
+    """Store session data in the process memory, in LRU cache of
+    ``maxsize`` sessions. Expired sessions are removed when they are read.
+    Sessions are lost when the process exits and are not shared with
+    other worker processes, see :class:`SharedMemorySessionManager`.
+    ::
+
+        app.session_cls = MemorySessionManager(maxsize=10000)
+    """
+
+    def __init__(self, maxsize=10000):
+        self.maxsize = maxsize
+        self._sessions = collections.OrderedDict()
+        self._lock = threading.Lock()
+
+    def load(self, sid):
+        with self._lock:
+            entry = self._sessions.get(sid)
+            if entry is None:
+                return None
+            if entry[0] < time.monotonic():
+                del self._sessions[sid]
+                return None
+            self._sessions.move_to_end(sid)
+            return entry[1]
+
+    def store(self, sid, value, expire):
+        with self._lock:
+            self._sessions[sid] = (time.monotonic() + expire, value)
+            self._sessions.move_to_end(sid)
+            if len(self._sessions) > self.maxsize:
+                # least recently used
+                self._sessions.popitem(last=False)
+
+    def delete(self, sid):
+        with self._lock:
+            self._sessions.pop(sid, None)
+
+    def touch(self, sid, expire):
+        with self._lock:
+            entry = self._sessions.get(sid)
+            if entry is not None:
+                self._sessions[sid] = (time.monotonic() + expire, entry[1])
+
+    def __len__(self):
+        return len(self._sessions)
+
+
+class SharedMemorySessionManager(ServerSessionManager):
+    """Store session data in memory mapped file shared by the worker
+    processes of the server (prefork servers like gunicorn), without
+    network hop.
+
+    The file is hash table of ``slots`` fixed size slots, a session is
+    stored in one of ``probe`` slots from the session id hash. When they
+    are all used, the least recently used session among them is evicted.
+    Serialized session data must fit in ``slot_size - 36`` bytes.
+    Uses ``fcntl`` file locks, available on unix.
+    ::
+
+        app.session_cls = SharedMemorySessionManager(
+            '/dev/shm/myapp-sessions', slots=65536, slot_size=1024
+        )
+
+    :param path: file shared by the processes, use a file in ``/dev/shm``
+        to keep it in memory.
+    """
+
+    #: key, expires, last access, data length
+    _header = struct.Struct("<16sddI")
+    probe = 8
+
+    def __init__(self, path, slots=65536, slot_size=1024):
+        if fcntl is None:
+            raise RuntimeError("SharedMemorySessionManager requires fcntl (unix)")
+        if slot_size <= self._header.size:
+            raise ValueError("slot_size must be larger than %s" % self._header.size)
+        self.path = path
+        self.slots = slots
+        self.slot_size = slot_size
+        self._lock = threading.Lock()
+        self._pid = None
+        self._file = None
+        self._map = None
+
+    def _open(self):
+        # each process opens the file, flock locks are
+        # shared by the processes using the same file description
+        fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o600)
+        file = os.fdopen(fd, "r+b")
+        size = self.slots * self.slot_size
+        fcntl.flock(file, fcntl.LOCK_EX)
+        try:
+            if os.fstat(fd).st_size < size:
+                file.truncate(size)
+        finally:
+            fcntl.flock(file, fcntl.LOCK_UN)
+        self._file = file
+        self._map = mmap.mmap(fd, size)
+        self._pid = os.getpid()
+
+    @contextlib.contextmanager
+    def _locked(self):
+        with self._lock:
+            if self._pid != os.getpid():
+                self._open()
+            fcntl.flock(self._file, fcntl.LOCK_EX)
+            try:
+                yield self._map
+            finally:
+                fcntl.flock(self._file, fcntl.LOCK_UN)
+
+    def _slots(self, key):
+        start = int.from_bytes(key[:8], "little") % self.slots
+        for i in range(self.probe):
+            yield ((start + i) % self.slots) * self.slot_size
+
+    def _find(self, mm, key):
+        for offset in self._slots(key):
+            if self._header.unpack_from(mm, offset)[0] == key:
+                return offset
+        return None
+
+    @staticmethod
+    def _key(sid):
+        return hashlib.blake2b(sid.encode(), digest_size=16).digest()
+
+    def load(self, sid):
+        key = self._key(sid)
+        header = self._header
+        with self._locked() as mm:
+            offset = self._find(mm, key)
+            if offset is None:
+                return None
+            _, expires, _, length = header.unpack_from(mm, offset)
+            now = time.time()
+            if expires < now:
+                header.pack_into(mm, offset, bytes(16), 0, 0, 0)
+                return None
+            header.pack_into(mm, offset, key, expires, now, length)
+            start = offset + header.size
+            return mm[start : start + length]
+
+    def store(self, sid, value, expire):
+        header = self._header
+        if len(value) > self.slot_size - header.size:
+            raise ValueError(
+                "session data (%s bytes) is larger than the slot size" % len(value)
+            )
+        key = self._key(sid)
+        now = time.time()
+        with self._locked() as mm:
+            offset = self._find(mm, key)
+            if offset is None:
+                # empty or expired slot, else the least recently used
+                candidates = []
+                for slot in self._slots(key):
+                    _, expires, accessed, _ = header.unpack_from(mm, slot)
+                    if expires < now:
+                        offset = slot
+                        break
+                    candidates.append((accessed, slot))
+                else:
+                    offset = min(candidates)[1]
+            header.pack_into(mm, offset, key, now + expire, now, len(value))
+            start = offset + header.size
+            mm[start : start + len(value)] = value
+
+    def delete(self, sid):
+        key = self._key(sid)
+        with self._locked() as mm:
+            offset = self._find(mm, key)
+            if offset is not None:
+                self._header.pack_into(mm, offset, bytes(16), 0, 0, 0)
+
+    def touch(self, sid, expire):
+        key = self._key(sid)
+        header = self._header
+        with self._locked() as mm:
+            offset = self._find(mm, key)
+            if offset is not None:
+                _, _, _, length = header.unpack_from(mm, offset)
+                now = time.time()
+                header.pack_into(mm, offset, key, now + expire, now, length)
+
+
+#: marker of queued expiry updates
+_touched = object()
+
+
+class SQLiteSessionManager(ServerSessionManager):
+    """Store session data in sqlite database, sessions survive restarts
+    of the app.
+    ::
+
+        app.session_cls = SQLiteSessionManager('sessions.db', flush_interval=0.05)
+
+    Writes are queued and written in one transaction every
+    ``flush_interval`` seconds by a background thread, the response is
+    not delayed by the database. Sessions read before their transaction
+    is committed are returned from the queue. Expired sessions are deleted by the same
+    thread every ``sweep_interval`` seconds, ``sweep_chunk`` rows per
+    transaction. Call :meth:`flush` to write the queued sessions now.
+    It can be created before the workers of prefork servers are forked,
+    each process opens its own connections and background thread.
+    """
+
+    _CREATE = (
+        "CREATE TABLE IF NOT EXISTS sessions "
+        "(sid TEXT PRIMARY KEY, data BLOB NOT NULL, expires REAL NOT NULL)"
+    )
+    _CREATE_INDEX = "CREATE INDEX IF NOT EXISTS sessions_expires ON sessions (expires)"
+    _SELECT = "SELECT data FROM sessions WHERE sid = ? AND expires > ?"
+    _UPSERT = (
+        "INSERT INTO sessions (sid, data, expires) VALUES (?, ?, ?) "
+        "ON CONFLICT (sid) DO UPDATE SET data = excluded.data, "
+        "expires = excluded.expires"
+    )
+    _TOUCH = "UPDATE sessions SET expires = ? WHERE sid = ?"
+    _DELETE = "DELETE FROM sessions WHERE sid = ?"
+    _SWEEP = (
+        "DELETE FROM sessions WHERE sid IN "
+        "(SELECT sid FROM sessions WHERE expires <= ? LIMIT ?)"
+    )
+
+    def __init__(
+        self, path, flush_interval=0.05, sweep_interval=60, sweep_chunk=1000
+    ):
+        self.path = path
+        self.flush_interval = flush_interval
+        self.sweep_interval = sweep_interval
+        self.sweep_chunk = sweep_chunk
+        self._local = threading.local()
+        # sid: (data, expires), data is None for deleted sessions
+        # and _touched when only the expiry changed
+        self._pending = {}
+        # batch being written by flush(), read until it is committed
+        self._flushing = {}
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._pid = None
+        self._stop = threading.Event()
+        self._next_sweep = 0
+        # connections opened before a fork, never used or closed
+        # in the child, sqlite connections can't cross fork
+        self._forked_connections = []
+        atexit.register(self.flush)
+        if hasattr(os, "register_at_fork"):
+            os.register_at_fork(after_in_child=self._after_fork)
+
+    def _after_fork(self):
+        # the writes queued by the parent are written by the parent,
+        # the locks may be held by threads that don't exist here
+        self._pending = {}
+        self._flushing = {}
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._pid = None
+
+    @property
+    def connection(self):
+        """sqlite connection of the current thread and process"""
+        local = self._local
+        pid = os.getpid()
+        conn = getattr(local, "connection", None)
+        if conn is None or local.pid != pid:
+            if conn is not None:
+                self._forked_connections.append(conn)
+            conn = sqlite3.connect(self.path, timeout=30, cached_statements=16)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            with conn:
+                conn.execute(self._CREATE)
+                conn.execute(self._CREATE_INDEX)
+            local.connection = conn
+            local.pid = pid
+        return conn
+
+    def _start(self):
+        # started in the process handling requests, threads don't
+        # survive the fork of prefork servers
+        if self._pid == os.getpid():
             return
-        expire = app.config["SESSION_COOKIE_MAXAGE"]
-        if expire:
+        with self._lock:
+            if self._pid != os.getpid():
+                self._pid = os.getpid()
+                thread = threading.Thread(
+                    target=self._run, name="glass-sqlite-sessions", daemon=True
+                )
+                thread.start()
+
+    def _run(self):
+        while not self._stop.wait(self.flush_interval):
             try:
-                expire = int(expire)
-            except ValueError:
-                expire = 60 * 60 * 24 * 30
-        else:
-            expire = 60 * 60 * 24 * 30
-        session_data = pickle.dumps(data)
-        cookie = previous_cookie or get_random(35)
-        self._redis.set(cookie, session_data, ex=int(expire))
-        response.set_cookie(name, cookie, **cookie_config)
+                self.flush()
+                if self.sweep_interval and time.monotonic() >= self._next_sweep:
+                    self._next_sweep = time.monotonic() + self.sweep_interval
+                    self.sweep()
+            except sqlite3.Error:
+                logger.exception("Failed to write sessions to %s", self.path)
+
+    def _queue(self, sid, data, expires):
+        with self._lock:
+            self._pending[sid] = (data, expires)
+        self._start()
+
+    def load(self, sid):
+        now = time.time()
+        # _flushing is set before _pending is emptied
+        for queue in (self._pending, self._flushing):
+            entry = queue.get(sid)
+            if entry is not None and entry[0] is not _touched:
+                data, expires = entry
+                return data if data is not None and expires > now else None
+        row = self.connection.execute(self._SELECT, (sid, now)).fetchone()
+        return row[0] if row else None
+
+    def store(self, sid, value, expire):
+        self._queue(sid, value, time.time() + expire)
+
+    def delete(self, sid):
+        self._queue(sid, None, 0)
+
+    def touch(self, sid, expire):
+        expires = time.time() + expire
+        with self._lock:
+            data = self._pending.get(sid, (_touched,))[0]
+            if data is not None:
+                self._pending[sid] = (data, expires)
+        self._start()
+
+    def flush(self):
+        """Write the queued sessions in one transaction"""
+        with self._flush_lock:
+            with self._lock:
+                pending = self._flushing = self._pending
+                self._pending = {}
+            if not pending:
+                return
+            upserts = []
+            touches = []
+            deletes = []
+            for sid, (data, expires) in pending.items():
+                if data is None:
+                    deletes.append((sid,))
+                elif data is _touched:
+                    touches.append((expires, sid))
+                else:
+                    upserts.append((sid, data, expires))
+            try:
+                with self.connection as conn:
+                    conn.executemany(self._UPSERT, upserts)
+                    conn.executemany(self._TOUCH, touches)
+                    conn.executemany(self._DELETE, deletes)
+            except sqlite3.Error:
+                # keep them for the next flush, unless newer writes exist
+                with self._lock:
+                    pending.update(self._pending)
+                    self._pending = pending
+                    self._flushing = {}
+                raise
+            # committed, the database has them
+            self._flushing = {}
+
+    def sweep(self):
+        """Delete expired sessions, returns the number of deleted rows"""
+        conn = self.connection
+        now = time.time()
+        deleted = 0
+        while True:
+            with conn:
+                count = conn.execute(self._SWEEP, (now, self.sweep_chunk)).rowcount
+            deleted += count
+            if count < self.sweep_chunk:
+                return deleted
+
+    def close(self):
+        """Stop the background thread and write the queued sessions"""
+        self._stop.set()
+        self.flush()
+
+
+def _session_cookie(sid):
+    # session id and the time the cookie is issued
+    return "%s.%x" % (sid, int(time.time()))
+
+
+def _split_session_cookie(cookie):
+    sid, _, issued = cookie.partition(".")
+    try:
+        return sid, int(issued, 16)
+    except ValueError:
+        return sid, None
 
 
 session = Session()
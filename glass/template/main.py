@@ -43,9 +43,26 @@ class Template:
         """Render template"""
         if self._compiled_nodes is None:
             self.compile()
-        self.context.update(context)
-        self.context[const.TEMPLATE_FILENAME] = self.filename
-        return self._compiled_nodes.render(self.context, self.env)
+        return self._compiled_nodes.render(self._new_context(context), self.env)
+
+    def generate(self, context):
+        """Render template in parts, returns generator of ``str``.
+        ::
+
+          for part in template.generate({'users': users}):
+              send(part)
+        """
+        if self._compiled_nodes is None:
+            self.compile()
+        return self._compiled_nodes.generate(self._new_context(context), self.env)
+
+    def _new_context(self, context):
+        # templates are cached and shared by the requests, each
+        # render has its own context
+        ctx = dict(self.context)
+        ctx.update(context)
+        ctx[const.TEMPLATE_FILENAME] = self.filename
+        return ctx
 
     def add_tags(self, tags):
         self.tags.update(tags)
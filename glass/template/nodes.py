@@ -56,6 +56,12 @@ class Node:
     def render(self, context, env=None):
         return ""
 
+    def generate(self, context, env=None):
+        """Render the node in parts, used to stream the template.
+        Nodes with body override this to yield the body node by node.
+        """
+        yield self.render(context, env)
+
 
 class TextNode(Node):
     def __init__(self, text):
@@ -207,17 +213,27 @@ class IfNode(Node):
         super().__init__()
 
     def render(self, context, env=None):
+        body = self.get_body(context, env)
+        if body is None:
+            return ""
+        return body.render(context, env)
+
+    def generate(self, context, env=None):
+        body = self.get_body(context, env)
+        if body is not None:
+            yield from body.generate(context, env)
+
+    def get_body(self, context, env=None):
         match = self.condition.eval(context, env)
         if match:
-            return self.body.render(context, env)
+            return self.body
         for elif_ in self.elifs:
             match = elif_.condition.eval(context, env)
             if match:
-                return elif_.body.render(context, env)
+                return elif_.body
         if self.else_:
-            body = self.else_.body
-            return body.render(context, env)
-        return ""
+            return self.else_.body
+        return None
 
 
 class ForNode(Node):
@@ -229,16 +245,20 @@ class ForNode(Node):
         self.else_ = else_
 
     def render(self, context, env=None):
+        return "".join(self.generate(context, env))
+
+    def generate(self, context, env=None):
+        """Render the loop body item by item"""
         iter_object = self.iter_object.eval(context, env)
         for_context = context.copy()
         if not hasattr(iter_object, "__iter__"):
-            return ""
+            return
         loopvars = self.loopvars
-        result = []
         multi = len(loopvars) > 1
         use_else = True
         if not hasattr(iter_object, "__len__"):
             iter_object = list(iter_object)
+        loop = LoopCounter(iter_object)
         for index, item in enumerate(iter_object):
             use_else = False
             if multi:
@@ -261,14 +281,11 @@ class ForNode(Node):
                 for_context.update(key_value)
             else:
                 for_context[self.loopvars[0]] = item
-            loop = LoopCounter(iter_object)
             loop.set_index(index)
             for_context["loop"] = loop
-            result.append(self.body.render(for_context, env))
+            yield self.body.render(for_context, env)
         if use_else and self.else_ is not None:
-
-            return self.else_.body.render(for_context, env)
-        return "".join(result)
+            yield self.else_.body.render(for_context, env)
 
 
 class ElseNode(Node):
@@ -380,6 +397,15 @@ class IncludeNode(Node):
             return template.render(context)
         return ""
 
+    def generate(self, context, env=None):
+        if env is None:
+            return
+        template_name = self.template.eval(context, env)
+        if template_name is None:
+            yield self.render(context, env)
+            return
+        yield from env.get_template(template_name).generate(context)
+
 
 class ExtendNode(Node):
     def __init__(self, template, nodelist):
@@ -388,49 +414,61 @@ class ExtendNode(Node):
 
     def render(self, context, env=None):
         if env:
-            template = self.template.eval(context, env)
-            if template is None:
-                # {% extends name %}
-                msg = (
-                    "Couldn't find template refers to as '%s' in extend tag."
-                    % self.template.var_name
-                )
-                raise TemplateSyntaxError(msg)
-            parent = env.get_template(template)
-            parent_nodelist = parent.body
-            extend = None
-            parent_blocks = iter([])
-            if len(parent_nodelist.nodelist) > 0:
-                first_node = parent_nodelist.nodelist[0]
-                if first_node.__class__ is self.__class__:
-                    extend = first_node
-                    parent_blocks = extend.nodelist.get_node_by_type(BlockNode)
+            return self.get_parent(context, env).render(context)
+        return self.nodelist.render(context, env)
+
+    def generate(self, context, env=None):
+        if env:
+            yield from self.get_parent(context, env).generate(context)
+        else:
+            yield from self.nodelist.generate(context, env)
+
+    def get_parent(self, context, env):
+        """Parent template with the blocks replaced by the blocks of
+        this template.
+        """
+        template = self.template.eval(context, env)
+        if template is None:
+            # {% extends name %}
+            msg = (
+                "Couldn't find template refers to as '%s' in extend tag."
+                % self.template.var_name
+            )
+            raise TemplateSyntaxError(msg)
+        parent = env.get_template(template)
+        parent_nodelist = parent.body
+        extend = None
+        parent_blocks = iter([])
+        if len(parent_nodelist.nodelist) > 0:
+            first_node = parent_nodelist.nodelist[0]
+            if first_node.__class__ is self.__class__:
+                extend = first_node
+                parent_blocks = extend.nodelist.get_node_by_type(BlockNode)
+            else:
+                parent_blocks = parent_nodelist.get_node_by_type(BlockNode)
+        parent_blocks = {block.name: block for block in parent_blocks}
+        blocks = self.nodelist.get_node_by_type(BlockNode)
+        for block in blocks:
+            if block.name in parent_blocks:
+                current_block = parent_blocks[block.name]
+                if block.is_super:
+                    current_block.nodelist.add_node(block)
+                elif block.is_super_end:
+                    current_block.nodelist.insert_node(0, block)
                 else:
-                    parent_blocks = parent_nodelist.get_node_by_type(BlockNode)
-            parent_blocks = {block.name: block for block in parent_blocks}
-            blocks = self.nodelist.get_node_by_type(BlockNode)
-            for block in blocks:
-                if block.name in parent_blocks:
-                    current_block = parent_blocks[block.name]
-                    if block.is_super:
-                        current_block.nodelist.add_node(block)
-                    elif block.is_super_end:
-                        current_block.nodelist.insert_node(0, block)
+                    if extend:
+                        extend.nodelist.replace_node(current_block, block)
                     else:
-                        if extend:
-                            extend.nodelist.replace_node(current_block, block)
-                        else:
-                            parent.nodelist.replace_node(current_block, block)
-                elif extend:
-                    # This block is not found in the parent template. Parent template also
-                    # extends another template.
-                    extend.nodelist.add_node(block)
-                else:
-                    # block not found, parent doesn't extend other template.
-                    # ignore ? warning ? just append it ?
-                    pass
-            return parent.render(context)
-        return self.nodelist.render(context, env)
+                        parent.nodelist.replace_node(current_block, block)
+            elif extend:
+                # This block is not found in the parent template. Parent template also
+                # extends another template.
+                extend.nodelist.add_node(block)
+            else:
+                # block not found, parent doesn't extend other template.
+                # ignore ? warning ? just append it ?
+                pass
+        return parent
 
     def __repr__(self):
         return "<ExtendNode template={}".format(self.template.var_name)
@@ -446,6 +484,9 @@ class BlockNode(Node):
     def render(self, context, env=None):
         return self.nodelist.render(context, env)
 
+    def generate(self, context, env=None):
+        return self.nodelist.generate(context, env)
+
     def __repr__(self):
         return "<BlockNode name={} is_super={} is_super_end={}".format(
             self.name, self.is_super, self.is_super_end
@@ -481,10 +522,29 @@ class NodeList(Node):
                 )
                 continue
             results.append(str(result))
+        self._restore_nodelist()
+        return "".join(results)
+
+    def generate(self, context, env=None):
+        """Render the nodes one by one"""
+        try:
+            for node in self.nodelist:
+                for result in node.generate(context, env):
+                    if result is None:
+                        logger.warning(
+                            "%s returns None"
+                            "  all template nodes are expected to return str"
+                            "  the result of this node is ignored" % node.__class__
+                        )
+                        continue
+                    yield str(result)
+        finally:
+            self._restore_nodelist()
+
+    def _restore_nodelist(self):
         if hasattr(self, "_original_nodes_"):
             self.nodelist = self._original_nodes_
             del self._original_nodes_
-        return "".join(results)
 
     def get_node_by_type(self, nodetype):
         for node in self.nodelist:
@@ -49,6 +49,29 @@ def render_string(string, context=None, **kwargs):
     return backend_render(string, context, **kwargs)
 
 
+def stream_template(template, context=None, **kwargs):
+    """Render template in parts, returns generator of ``str``
+    to use with :class:`~glass.response.StreamingResponse`.
+    Long pages are sent to the client as they are rendered.
+    ::
+
+        @app.route('/report')
+        def report():
+            rows = db.rows()
+            return StreamingResponse(stream_template('report.html', rows=rows))
+    """
+    if context is not None:
+        if not isinstance(context, dict):
+            raise ValueError("context must be dict")
+    context = context or {}
+    context = Context(context)
+    backend = app.config.get("TEMPLATE_BACKEND", "stl")
+    backend_stream = TEMPLATE_STREAM.get(backend)
+    if not backend_stream:
+        raise ValueError("Unknown template backend %s" % backend)
+    return backend_stream(template, context, **kwargs)
+
+
 def _render_stl_string(string, context, **kwargs):
     """Render string using the builtin template."""
     env = app.template_env
@@ -64,6 +87,13 @@ def _render_stl_template(template, context, **kwargs):
     return env.render_template(template, context)
 
 
+def _stream_stl_template(template, context, **kwargs):
+    """Stream template file using builtin template ``stl``"""
+    env = app.template_env
+    context.update(kwargs)
+    return env.get_template(template).generate(context)
+
+
 class AppTemplateEnviron(Environment):
     def __init__(self, app, *args, **kwargs):
         self.app = app
@@ -185,6 +215,12 @@ def _render_jinja_template(template, context, **kwargs):
     return template.render(context, **kwargs)
 
 
+def _stream_jinja_template(template, context, **kwargs):
+    """Stream template file using ``jinja``"""
+    template = app.jinja_env.get_template(template)
+    return template.generate(context, **kwargs)
+
+
 TEMPLATE_RENDER = {
     "jinja": _render_jinja_template,
     "jinja2": _render_jinja_template,
@@ -196,3 +232,9 @@ STRING_RENDER = {
     "jinja2": _render_jinja_string,
     "stl": _render_stl_string,
 }
+
+TEMPLATE_STREAM = {
+    "jinja": _stream_jinja_template,
+    "jinja2": _stream_jinja_template,
+    "stl": _stream_stl_template,
+}
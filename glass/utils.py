@@ -1,6 +1,7 @@
+import contextvars
 import functools
+import operator
 import secrets
-import threading
 
 
 class cached_property:
@@ -33,32 +34,72 @@ class cached_property:
         raise TypeError("cant set attribute")
 
 
-def _thread_local():
-    """This is very useful on multithread
-    web servers
+class RequestContext:
+    """State of the current request: request environ,
+    request storage and session data.
+    One object per request held in ``request_context``, the
+    attributes of ``request`` and ``session`` resolve through it.
+    """
+
+    __slots__ = (
+        "environ",
+        "storage",
+        "session_data",
+        "session_modified",
+        "session_manager",
+        "session_issued",
+        "session_saved",
+        "session_flashes",
+    )
+
+    def __init__(self, environ=None):
+        if environ is not None:
+            self.environ = environ
+        self.storage = {}
+        self.session_modified = False
+        self.session_manager = None
+        self.session_issued = None
+        self.session_saved = False
+        self.session_flashes = None
+
+
+request_context = contextvars.ContextVar("glass.request_context")
+
+
+def _context_property(attr):
+    """Property for ``attr`` of the current :class:`RequestContext`.
+    The context is local to the thread or asyncio task handling the
+    request, this works on multithread web servers and asgi servers.
     credit: github.com/bottlepy/bottlepy
     """
-    ls = threading.local()
+    getter = operator.attrgetter(attr)
+    get_context = request_context.get
 
     def fget(obj):
         try:
-            return ls.var
-        except AttributeError:
+            return getter(get_context())
+        except (LookupError, AttributeError):
             if obj.__class__.__name__ in ("Request", "Session"):
                 raise RuntimeError(
                     "Request context not initialized. "
                     "This means you are trying to use function that "
                     "requires HTTP request"
-                )
-            raise RuntimeError("%s object not initialized" % obj.__class__.__name__)
+                ) from None
+            raise RuntimeError(
+                "%s object not initialized" % obj.__class__.__name__
+            ) from None
 
     def fset(_, value):
-        ls.var = value
+        context = request_context.get(None)
+        if context is None:
+            context = RequestContext()
+            request_context.set(context)
+        setattr(context, attr, value)
 
     def fdel(_):
-        del ls.var
+        delattr(request_context.get(), attr)
 
-    return property(fget, fset, fdel, "Thread-local property")
+    return property(fget, fset, fdel, "Request context property")
 
 
 def encode(value, encoding="utf-8"):
@@ -0,0 +1,445 @@
+import threading
+from wsgiref.util import setup_testing_defaults
+
+from glass import GlassApp
+
+
+def call(app, path, method='GET', **environ):
+    # run in a thread like the wsgi server,
+    # the request stays bound to the thread
+    environ['PATH_INFO'] = path
+    environ['REQUEST_METHOD'] = method
+    setup_testing_defaults(environ)
+    result = {}
+
+    def start_response(status, headers):
+        result['status'] = status
+        result['headers'] = headers
+
+    def run():
+        result['body'] = b''.join(app(environ, start_response))
+
+    thread = threading.Thread(target=run)
+    thread.start()
+    thread.join()
+    return result['status'], dict(result['headers']), result['body']
+
+
+app = GlassApp()
+app.config['DEBUG'] = False
+calls = []
+
+
+@app.before_request
+def before():
+    calls.append('before')
+
+
+@app.route('/item', methods=['GET', 'POST'])
+def item():
+    calls.append('view')
+    return 'item'
+
+
+@app.route('/item', methods=['DELETE'], view_name='delete_item')
+def delete_item():
+    return 'deleted'
+
+
+def test_method_dispatch():
+    assert call(app, '/item')[2] == b'item'
+    assert call(app, '/item', 'DELETE')[2] == b'deleted'
+    status, headers, body = call(app, '/item', 'PUT')
+    assert status.startswith('405')
+    assert headers['Allow'] == 'DELETE, GET, HEAD, OPTIONS, POST'
+
+
+def test_head_and_options():
+    calls.clear()
+    status, headers, body = call(app, '/item', 'HEAD')
+    assert status.startswith('200')
+    assert headers['Content-Length'] == '4'
+    assert body == b''
+    calls.clear()
+    status, headers, body = call(app, '/item', 'OPTIONS')
+    assert status.startswith('200')
+    assert headers['Allow'] == 'DELETE, GET, HEAD, OPTIONS, POST'
+    assert calls == []
+
+
+def test_blueprint():
+    from glass import Blueprint, url_for
+
+    bp_app = GlassApp()
+    bp_app.config['DEBUG'] = False
+    api = Blueprint('api', url_prefix='/api/v1')
+    hooks = []
+
+    @api.route('/users/<int:id>')
+    def user(id):
+        return 'user %s' % id
+
+    @api.before_request
+    def api_before():
+        hooks.append('api')
+
+    @bp_app.route('/users/<int:id>')
+    def app_user(id):
+        return 'app user'
+
+    @bp_app.route('/api/v1/status')
+    def status():
+        return 'ok'
+
+    @bp_app.route('/api/v1/items')
+    def items():
+        return 'items'
+
+    @api.route('/items', methods=['POST'])
+    def add_item():
+        return 'added'
+
+    bp_app.register_blueprint(api)
+    assert call(bp_app, '/api/v1/users/1')[2] == b'user 1'
+    assert hooks == ['api']
+    assert call(bp_app, '/users/1')[2] == b'app user'
+    # not in the blueprint, matched by the app router
+    assert call(bp_app, '/api/v1/status')[2] == b'ok'
+    assert hooks == ['api']
+    # same path split by method between the blueprint and the app
+    assert call(bp_app, '/api/v1/items')[2] == b'items'
+    assert call(bp_app, '/api/v1/items', 'POST')[2] == b'added'
+    status, headers, body = call(bp_app, '/api/v1/items', 'PUT')
+    assert status.startswith('405')
+    assert headers['Allow'] == 'GET, HEAD, OPTIONS, POST'
+    status, headers, body = call(bp_app, '/api/v1/items', 'OPTIONS')
+    assert headers['Allow'] == 'GET, HEAD, OPTIONS, POST'
+    with bp_app.mount():
+        assert url_for('api.user', id=3) == '/api/v1/users/3'
+
+
+def test_freeze():
+    import pytest
+
+    frozen_app = GlassApp()
+
+    @frozen_app.route('/u/<name>')
+    def profile(name):
+        return name
+
+    @frozen_app.route('/u/admin')
+    def admin():
+        return 'admin'
+
+    @frozen_app.route('/u/<name>', view_name='profile2')
+    def profile2(name):
+        return name
+
+    problems = frozen_app.router.validate()
+    assert len(problems) == 2
+    with pytest.raises(ValueError):
+        frozen_app.freeze(strict=True)
+    assert not frozen_app.frozen
+    assert call(frozen_app, '/u/glass')[2] == b'glass'
+    assert frozen_app.frozen
+    with pytest.raises(RuntimeError):
+        frozen_app.route('/new')(admin)
+
+
+def test_request_context():
+    import contextvars
+
+    from glass import request, session
+
+    def handle(path):
+        environ = {'PATH_INFO': path}
+        setup_testing_defaults(environ)
+        request.bind(environ)
+        session.bind({'path': path})
+        request.user = path
+        return request.path, request.user, session['path']
+
+    assert contextvars.copy_context().run(handle, '/a') == ('/a', '/a', '/a')
+    assert contextvars.copy_context().run(handle, '/b') == ('/b', '/b', '/b')
+
+    def unbound():
+        try:
+            request.path
+        except RuntimeError:
+            return True
+
+    # a new request starts with empty storage
+    assert contextvars.Context().run(unbound)
+
+
+def test_pipeline_rebuilt_with_hooks():
+    app = GlassApp()
+    app.config['DEBUG'] = False
+
+    @app.route('/')
+    def index():
+        return 'index'
+
+    app.freeze()
+    fast = app._pipeline
+    assert call(app, '/')[2] == b'index'
+
+    @app.after_request
+    def upper(response):
+        response.content = response.content.upper()
+        return response
+
+    assert app._pipeline is None
+    assert call(app, '/')[2] == b'INDEX'
+    assert app._pipeline is not fast
+
+    @app.error(404)
+    def not_found(exc):
+        return 'missing'
+
+    assert call(app, '/nothing')[2] == b'MISSING'
+
+
+def test_lazy_session():
+    from glass import session
+
+    class Manager:
+        def __init__(self):
+            self.calls = []
+
+        def open(self):
+            self.calls.append('open')
+            session.bind({'name': 'glass'})
+
+        def save(self, response):
+            self.calls.append('save')
+
+    app = GlassApp()
+    app.config['DEBUG'] = False
+    app.session_cls = manager = Manager()
+
+    @app.route('/api')
+    def api():
+        return {'ok': True}
+
+    @app.route('/name')
+    def name():
+        return session.get('name')
+
+    @app.route('/set')
+    def set_name():
+        session['name'] = 'new'
+        return str(session.modified)
+
+    assert call(app, '/api')[0] == '200 OK'
+    assert manager.calls == []
+    assert call(app, '/name')[2] == b'glass'
+    assert manager.calls == ['open', 'save']
+    # modified is kept when the first access is a write
+    assert call(app, '/set')[2] == b'True'
+
+
+def test_streaming_response(tmp_path):
+    from glass import StreamingResponse, request, stream_template, url_for
+
+    (tmp_path / 'rows.html').write_text(
+        '{% for row in rows %}<td>{{row}}</td>{% endfor %}'
+    )
+    app = GlassApp()
+    app.config['DEBUG'] = False
+    app.config['TEMPLATES_FOLDER'] = str(tmp_path)
+
+    @app.route('/export.csv')
+    def export():
+        def rows():
+            yield 'path,url\n'
+            for i in range(3):
+                # runs after the view returned
+                yield '%s,%s\n' % (request.path, url_for('export'))
+
+        return StreamingResponse(rows(), content_type='text/csv')
+
+    @app.route('/numbers')
+    def numbers():
+        return (str(i) for i in range(3))
+
+    @app.route('/rows')
+    def rows():
+        return StreamingResponse(stream_template('rows.html', rows=range(3)))
+
+    status, headers, body = call(app, '/export.csv')
+    assert 'Content-Length' not in headers
+    assert headers['Content-Type'] == 'text/csv; charset=utf-8'
+    assert body == b'path,url\n' + b'/export.csv,/export.csv\n' * 3
+    status, headers, body = call(app, '/numbers')
+    assert status == '200 OK'
+    assert body == b'012'
+    assert call(app, '/rows')[2] == b'<td>0</td><td>1</td><td>2</td>'
+
+
+def test_interleaved_template_streams(tmp_path):
+    from glass import stream_template
+
+    (tmp_path / 'user.html').write_text(
+        '<h1>{{name}}</h1>{% for row in rows %}<td>{{row}}</td>{% endfor %}'
+        '<p>{{name}}</p>'
+    )
+    app = GlassApp()
+    app.config['TEMPLATES_FOLDER'] = str(tmp_path)
+    with app.mount():
+        alice = stream_template('user.html', name='alice', rows=[1, 2])
+        first = next(alice)
+        bob = stream_template('user.html', name='bob', rows=[3])
+        assert first + ''.join(alice) == (
+            '<h1>alice</h1><td>1</td><td>2</td><p>alice</p>'
+        )
+        assert ''.join(bob) == '<h1>bob</h1><td>3</td><p>bob</p>'
+
+
+def test_file_wrapper(tmp_path):
+    from wsgiref.util import FileWrapper
+
+    (tmp_path / 'app.js').write_bytes(b'x' * 100000)
+    app = GlassApp()
+    app.config['STATIC_FOLDER'] = str(tmp_path)
+    wrapped = []
+
+    def file_wrapper(file, block_size):
+        wrapped.append(block_size)
+        return FileWrapper(file, block_size)
+
+    status, headers, body = call(
+        app, '/static/app.js', **{'wsgi.file_wrapper': file_wrapper}
+    )
+    assert wrapped == [app.config['FILE_BLOCK_SIZE']]
+    assert headers['Content-Length'] == '100000'
+    assert body == b'x' * 100000
+    # without file_wrapper the file is read in blocks
+    app.config['FILE_BLOCK_SIZE'] = 4096
+    assert call(app, '/static/app.js')[2] == b'x' * 100000
+
+
+def test_range_requests(tmp_path):
+    from wsgiref.util import FileWrapper
+
+    data = bytes(range(256)) * 40
+    (tmp_path / 'video.mp4').write_bytes(data)
+    app = GlassApp()
+    app.config['STATIC_FOLDER'] = str(tmp_path)
+    path = '/static/video.mp4'
+
+    status, headers, body = call(app, path, HTTP_RANGE='bytes=100-199')
+    assert status == '206 Partial Content'
+    assert headers['Content-Range'] == 'bytes 100-199/10240'
+    assert headers['Content-Length'] == '100'
+    assert body == data[100:200]
+
+    # open ended range is sent with file_wrapper from the offset
+    status, headers, body = call(
+        app, path, HTTP_RANGE='bytes=-1000', **{'wsgi.file_wrapper': FileWrapper}
+    )
+    assert headers['Content-Range'] == 'bytes 9240-10239/10240'
+    assert body == data[-1000:]
+
+    status, headers, body = call(app, path, HTTP_RANGE='bytes=0-9,20-29')
+    assert status == '206 Partial Content'
+    content_type = headers['Content-Type']
+    assert content_type.startswith('multipart/byteranges; boundary=')
+    boundary = content_type.split('=', 1)[1].encode()
+    assert int(headers['Content-Length']) == len(body)
+    parts = body.split(b'--' + boundary)
+    assert parts[0] == b'' and parts[-1] == b'--\r\n'
+    assert parts[1].endswith(b'Content-Range: bytes 0-9/10240\r\n\r\n' + data[:10] + b'\r\n')
+    assert parts[2].endswith(b'\r\n\r\n' + data[20:30] + b'\r\n')
+
+    status, headers, body = call(app, path, HTTP_RANGE='bytes=20000-')
+    assert status == '416 Requested Range Not Satisfiable'
+    assert headers['Content-Range'] == 'bytes */10240'
+    assert body == b''
+
+    # If-Range doesn't match Last-Modified, send the whole file
+    status, headers, body = call(
+        app, path, HTTP_RANGE='bytes=0-9', HTTP_IF_RANGE='"old"'
+    )
+    assert status == '200 OK' and body == data
+    last_modified = headers['Last-Modified']
+    status, headers, body = call(
+        app, path, HTTP_RANGE='bytes=0-9', HTTP_IF_RANGE=last_modified
+    )
+    assert status == '206 Partial Content' and body == data[:10]
+
+
+def test_static_metadata_cache(tmp_path):
+    import os
+
+    static = tmp_path / 'static'
+    static.mkdir()
+    (static / 'app.css').write_text('body {}')
+    (tmp_path / 'secret.txt').write_text('secret')
+    app = GlassApp()
+    app.config['STATIC_FOLDER'] = str(static)
+
+    status, headers, body = call(app, '/static/app.css')
+    etag = headers['ETag']
+    assert headers['Content-Type'] == 'text/css; charset=utf-8'
+    assert body == b'body {}'
+    status, headers, body = call(app, '/static/app.css', HTTP_IF_NONE_MATCH=etag)
+    assert status == '304 Not Modified'
+    assert headers['ETag'] == etag and body == b''
+    status, _, _ = call(app, '/static/app.css', HTTP_IF_NONE_MATCH='"x", W/' + etag)
+    assert status == '304 Not Modified'
+
+    # cached until the recheck interval
+    os.utime(static / 'app.css', ns=(0, 10 ** 9))
+    assert call(app, '/static/app.css')[1]['ETag'] == etag
+    app.config['STATIC_RECHECK_INTERVAL'] = 0
+    status, headers, body = call(app, '/static/app.css', HTTP_IF_NONE_MATCH=etag)
+    assert status == '200 OK' and headers['ETag'] != etag
+
+    # rewritten within the recheck interval, Content-Length is the new size
+    app.config['STATIC_RECHECK_INTERVAL'] = 60
+    etag = call(app, '/static/app.css')[1]['ETag']
+    (static / 'app.css').write_text('body {color: red}')
+    status, headers, body = call(app, '/static/app.css')
+    assert headers['Content-Length'] == str(len(body))
+    assert body == b'body {color: red}' and headers['ETag'] != etag
+    os.remove(static / 'app.css')
+    assert call(app, '/static/app.css')[0] == '404 Not Found'
+
+    assert call(app, '/static/css/../../secret.txt')[0] == '404 Not Found'
+    assert call(app, '/static/missing.css')[0] == '404 Not Found'
+
+
+def test_precompressed_static(tmp_path):
+    import gzip
+
+    from glass.cli import compress_static
+
+    css = b'body { color: red; }\n' * 100
+    (tmp_path / 'app.css').write_bytes(css)
+    (tmp_path / 'logo.png').write_bytes(b'\x89PNG' * 100)
+    assert compress_static(str(tmp_path)) == [str(tmp_path / 'app.css.gz')]
+    # up to date
+    assert compress_static(str(tmp_path)) == []
+
+    app = GlassApp()
+    app.config['STATIC_FOLDER'] = str(tmp_path)
+    status, headers, body = call(
+        app, '/static/app.css', HTTP_ACCEPT_ENCODING='gzip, deflate, br'
+    )
+    assert headers['Content-Encoding'] == 'gzip'
+    assert headers['Vary'] == 'Accept-Encoding'
+    assert headers['Content-Type'] == 'text/css; charset=utf-8'
+    assert int(headers['Content-Length']) == len(body) < len(css)
+    assert gzip.decompress(body) == css
+    gzip_etag = headers['ETag']
+
+    status, headers, body = call(app, '/static/app.css', HTTP_ACCEPT_ENCODING='gzip;q=0')
+    assert 'Content-Encoding' not in headers and body == css
+    assert headers['Vary'] == 'Accept-Encoding'
+    assert headers['ETag'] != gzip_etag
+    status, _, _ = call(
+        app, '/static/app.css', HTTP_ACCEPT_ENCODING='gzip', HTTP_IF_NONE_MATCH=gzip_etag
+    )
+    assert status == '304 Not Modified'
+    assert 'Vary' not in call(app, '/static/logo.png', HTTP_ACCEPT_ENCODING='gzip')[1]
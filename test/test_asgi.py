@@ -0,0 +1,105 @@
+import asyncio
+
+from glass import GlassApp, request, url_for
+from glass.asgi import build_environ
+
+app = GlassApp()
+app.config['DEBUG'] = False
+
+
+@app.before_request
+async def load_user():
+    await asyncio.sleep(0)
+    request.user = request.args.get('user')
+
+
+@app.route('/hello/<name>')
+async def hello(name):
+    await asyncio.sleep(0.01)
+    # each task has its own request
+    return 'hello %s %s' % (name, request.user)
+
+
+@app.route('/sync', methods=['GET', 'POST'])
+def sync_view():
+    return {'data': request.get_data().decode()}
+
+
+@app.route('/stream/<int:count>')
+async def stream(count):
+    async def rows():
+        for i in range(count):
+            await asyncio.sleep(0)
+            yield '%s:%s\n' % (i, url_for('stream', count=i))
+
+    return rows()
+
+
+@app.route('/cookies')
+def cookies():
+    return '%s %s' % (request.cookies.get('theme'), request.cookies.get('session'))
+
+
+async def call(app, path, method='GET', query=b'', body=b'', headers=()):
+    scope = {
+        'type': 'http',
+        'method': method,
+        'path': path,
+        'query_string': query,
+        'headers': [(b'content-type', b'application/json'), *headers],
+    }
+    sent = []
+    messages = [{'type': 'http.request', 'body': body, 'more_body': False}]
+
+    async def receive():
+        return messages.pop(0)
+
+    async def send(message):
+        sent.append(message)
+
+    await app.asgi(scope, receive, send)
+    body = b''.join(m.get('body', b'') for m in sent[1:])
+    return sent[0]['status'], dict(sent[0]['headers']), body
+
+
+def test_asgi_concurrent_requests():
+    async def main():
+        return await asyncio.gather(
+            *(call(app, '/hello/%s' % i, query=b'user=u%d' % i) for i in range(20))
+        )
+
+    results = asyncio.run(main())
+    for i, (status, headers, body) in enumerate(results):
+        assert status == 200
+        assert body == b'hello %d u%d' % (i, i)
+
+
+def test_asgi_sync_view():
+    status, headers, body = asyncio.run(call(app, '/sync', 'POST', body=b'abc'))
+    assert status == 200
+    assert headers[b'Content-Type'] == b'application/json; charset=utf-8'
+    assert body == b'{"data":"abc"}'
+    status, headers, body = asyncio.run(call(app, '/missing'))
+    assert status == 404
+
+
+def test_asgi_async_generator():
+    status, headers, body = asyncio.run(call(app, '/stream/3'))
+    assert status == 200
+    assert b'Content-Length' not in headers
+    assert body == b'0:/stream/0\n1:/stream/1\n2:/stream/2\n'
+
+
+def test_asgi_repeated_cookie_headers():
+    headers = [
+        (b'cookie', b'theme=dark'),
+        (b'cookie', b'session=xyz'),
+        (b'accept', b'text/html'),
+        (b'accept', b'application/json'),
+    ]
+    scope = {'type': 'http', 'method': 'GET', 'path': '/', 'headers': headers}
+    environ = build_environ(scope, b'')
+    assert environ['HTTP_COOKIE'] == 'theme=dark; session=xyz'
+    assert environ['HTTP_ACCEPT'] == 'text/html,application/json'
+    status, _, body = asyncio.run(call(app, '/cookies', headers=headers))
+    assert body == b'dark xyz'
@@ -0,0 +1,16 @@
+import json
+
+from glass import bench
+
+
+def test_bench_routing(tmp_path):
+    output = tmp_path / 'routing.json'
+    data = bench.run('routing', output=str(output), sizes=[10, 50], requests=50)
+    result = json.loads(output.read_text())
+    assert result == json.loads(data)
+    assert [r['routes'] for r in result['results']] == [10, 50]
+    for r in result['results']:
+        assert r['match']['cold']['calls'] == 50
+        assert r['match_unfrozen']['cold']['calls'] == 50
+        assert r['match']['warm']['p99_us'] >= r['match']['warm']['p50_us']
+        assert r['url_for']['calls'] == 50
@@ -0,0 +1,54 @@
+import dataclasses
+import datetime
+import uuid
+
+import pytest
+
+from glass import GlassApp, jsonlib
+from glass.response import JsonResponse
+
+
+@dataclasses.dataclass
+class User:
+    id: uuid.UUID
+    name: str
+    joined: datetime.date
+
+
+user = User(uuid.UUID(int=1), 'glass', datetime.date(2020, 1, 2))
+expected = (
+    b'{"user":{"id":"00000000-0000-0000-0000-000000000001",'
+    b'"name":"glass","joined":"2020-01-02"},'
+    b'"at":"2020-01-02T03:04:05","tags":["\xc3\xa9"],"1":true}'
+)
+data = {
+    'user': user,
+    'at': datetime.datetime(2020, 1, 2, 3, 4, 5),
+    'tags': ['\xe9'],
+    1: True,
+}
+
+
+@pytest.mark.parametrize('name', ['stdlib', 'orjson'])
+def test_backends(name):
+    if name == 'orjson':
+        pytest.importorskip('orjson')
+    backend = jsonlib.get_backend(name)
+    assert backend.dumps(data) == expected
+    assert backend.loads(expected)['tags'] == ['\xe9']
+    with pytest.raises(TypeError):
+        backend.dumps({'x': object()})
+
+
+def test_json_backend_config():
+    app = GlassApp()
+    app.config['JSON_BACKEND'] = 'stdlib'
+    with app.mount():
+        response = JsonResponse({'user': user})
+        assert jsonlib.get_backend().name == 'stdlib'
+    assert response.content.startswith(b'{"user":{"id":')
+    assert response.headers['Content-Length'] == str(len(response.content))
+    app.config['JSON_BACKEND'] = 'unknown'
+    with app.mount():
+        with pytest.raises(ValueError):
+            JsonResponse({})
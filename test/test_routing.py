@@ -87,3 +87,210 @@ def test_optional_params():
     rule, kwargs = router.match(environ)
     assert rule is rule1
     assert kwargs == {'name':''}
+
+
+def test_route_priority():
+    # first registered rule wins, same as the order in Router.rules
+    rule1 = Rule('/u/<name>/')
+    rule2 = Rule('/u/admin/')
+    rule3 = Rule('/u/<int:id>/edit')
+    rule4 = Rule('/static/<path:filename>')
+    router = Router()
+    for rule in (rule1, rule2, rule3, rule4):
+        router.add(rule)
+    environ['PATH_INFO'] = '/u/admin/'
+    rule, kwargs = router.match(environ)
+    assert rule is rule1
+    assert kwargs == {'name': 'admin'}
+    environ['PATH_INFO'] = '/u/12/edit'
+    rule, kwargs = router.match(environ)
+    assert rule is rule3
+    assert kwargs == {'id': 12}
+    environ['PATH_INFO'] = '/static/css/main.css'
+    rule, kwargs = router.match(environ)
+    assert rule is rule4
+    assert kwargs == {'filename': 'css/main.css'}
+    with pytest.raises(HTTP404):
+        environ['PATH_INFO'] = '/u/12/edit/'
+        router.match(environ)
+    with pytest.raises(HTTP404):
+        environ['PATH_INFO'] = '/u/ab/edit'
+        router.match(environ)
+
+
+def test_many_routes():
+    router = Router()
+    rules = []
+    for i in range(500):
+        rule = Rule('/r%s/<int:id>/<name>' % i)
+        router.add(rule)
+        rules.append(rule)
+    environ['PATH_INFO'] = '/r499/5/glass'
+    rule, kwargs = router.match(environ)
+    assert rule is rules[-1]
+    assert kwargs == {'id': 5, 'name': 'glass'}
+    with pytest.raises(HTTP404):
+        environ['PATH_INFO'] = '/r500/5/glass'
+        router.match(environ)
+
+
+def test_regex_matcher():
+    router = Router(matcher='regex')
+    rule1 = Rule('/u/<name>/')
+    rule2 = Rule('/u/<int:id>/<name>')
+    rule3 = Rule('/settings/<name>/<value>?')
+    for rule in (rule1, rule2, rule3):
+        router.add(rule)
+    environ['PATH_INFO'] = '/u/glass'
+    rule, kwargs = router.match(environ)
+    assert rule is rule1
+    assert kwargs == {'name': 'glass'}
+    environ['PATH_INFO'] = '/u/3/glass'
+    rule, kwargs = router.match(environ)
+    assert rule is rule2
+    assert kwargs == {'id': 3, 'name': 'glass'}
+    environ['PATH_INFO'] = '/settings/security'
+    rule, kwargs = router.match(environ)
+    assert rule is rule3
+    assert kwargs == {'name': 'security', 'value': ''}
+    # rebuilt after a new rule is added
+    rule4 = Rule('/login')
+    router.add(rule4)
+    environ['PATH_INFO'] = '/login'
+    rule, kwargs = router.match(environ)
+    assert rule is rule4
+    with pytest.raises(HTTP404):
+        environ['PATH_INFO'] = '/logout'
+        router.match(environ)
+
+
+def test_regex_matcher_groups():
+    router = Router(matcher='regex')
+    matcher = router.combined
+    rules = [
+        Rule('/api/users/<int:id>'),
+        Rule('/<name>/users/<value>'),
+        Rule('/api/<name>'),
+        Rule('/api/users/'),
+    ]
+    for rule in rules:
+        router.add(rule)
+    # registration order wins across prefixes
+    assert matcher.match('/api/users/3') == (rules[0], ['3'])
+    assert matcher.match('/api/users/glass') == (rules[1], ['api', 'glass'])
+    assert matcher.match('/api/users') == (rules[2], ['users'])
+    assert matcher.match('/www/users/glass') == (rules[1], ['www', 'glass'])
+    assert matcher.match('/www') is None
+    # large groups match rule by rule
+    matcher.max_group = 2
+    matcher.build()
+    assert matcher.match('/api/users/glass') == (rules[1], ['api', 'glass'])
+    assert matcher.match('/api/users') == (rules[2], ['users'])
+
+
+def test_route_cache():
+    router = Router(cache_size=2)
+    rule1 = Rule('/u/<int:id>')
+    router.add(rule1)
+    environ['PATH_INFO'] = '/u/1'
+    router.match(environ)
+    rule, kwargs = router.match(environ)
+    assert rule is rule1
+    assert kwargs == {'id': 1}
+    assert router.cache.hits == 1
+    assert router.cache.misses == 1
+    for path in ('/u/2', '/u/3'):
+        environ['PATH_INFO'] = path
+        router.match(environ)
+    # /u/1 is the least recently used
+    assert len(router.cache) == 2
+    assert router.cache.get(('/u/1', '')) is None
+    # adding rule invalidates the cache
+    router.add(Rule('/u/admin'))
+    assert len(router.cache) == 0
+
+
+def test_route_methods():
+    from glass.exception import MethodNotAllow
+    from glass.routing import OptionsRule
+
+    get_rule = Rule('/item/<int:id>', methods=['GET'])
+    post_rule = Rule('/item/<int:id>', methods=['POST', 'PUT'])
+    router = Router()
+    router.add(get_rule)
+    router.add(post_rule)
+    env = {'PATH_INFO': '/item/1', 'REQUEST_METHOD': 'GET'}
+    assert router.match(env) == (get_rule, {'id': 1})
+    env['REQUEST_METHOD'] = 'PUT'
+    assert router.match(env) == (post_rule, {'id': 1})
+    env['REQUEST_METHOD'] = 'HEAD'
+    assert router.match(env)[0] is get_rule
+    env['REQUEST_METHOD'] = 'OPTIONS'
+    rule, kwargs = router.match(env)
+    assert isinstance(rule, OptionsRule)
+    assert rule.allow == 'GET, HEAD, OPTIONS, POST, PUT'
+    env['REQUEST_METHOD'] = 'DELETE'
+    with pytest.raises(MethodNotAllow) as exc:
+        router.match(env)
+    assert ('Allow', 'GET, HEAD, OPTIONS, POST, PUT') in exc.value.headers()
+
+
+def test_route_methods_param_names():
+    from glass.routing import rule_shape
+
+    get_rule = Rule('/u/<int:id>', methods=['GET'])
+    post_rule = Rule('/u/<int:uid>', methods=['POST'])
+    for matcher in ('tree', 'regex'):
+        router = Router(matcher=matcher)
+        router.add(get_rule)
+        router.add(post_rule)
+        env = {'PATH_INFO': '/u/5', 'REQUEST_METHOD': 'POST'}
+        assert router.match(env) == (post_rule, {'uid': 5})
+        env['REQUEST_METHOD'] = 'GET'
+        assert router.match(env) == (get_rule, {'id': 5})
+        env['REQUEST_METHOD'] = 'OPTIONS'
+        assert router.match(env)[0].allow == 'GET, HEAD, OPTIONS, POST'
+        assert router.validate() == []
+    assert rule_shape('/u/<id>/<int:page>?') == '/u/<str>/<int>?'
+    assert rule_shape('/u/<str:name>') == rule_shape('/u/<name>')
+
+
+def test_host_routing():
+    api = Rule('/users', host='api.example.com')
+    tenant = Rule('/users', host='<tenant>.example.com')
+    default = Rule('/users')
+    router = Router()
+    for rule in (api, tenant, default):
+        router.add(rule)
+    env = {'PATH_INFO': '/users', 'HTTP_HOST': 'API.example.com:8000'}
+    assert router.match(env) == (api, {})
+    env['HTTP_HOST'] = 'glass.example.com'
+    assert router.match(env) == (tenant, {'tenant': 'glass'})
+    env['HTTP_HOST'] = 'localhost'
+    assert router.match(env) == (default, {})
+    assert tenant.build_host(tenant='glass') == 'glass.example.com'
+
+
+def test_converter_fast_path():
+    from glass.routing import StrConverter
+
+    class SlugConverter(StrConverter):
+        # changes the regex, str fast path must not be used
+        regex = r'[a-z]+'
+        name = 'slug'
+
+    router = Router()
+    router.use_converter(SlugConverter)
+    rule1 = Rule('/p/<slug:title>/<int:id>')
+    rule2 = Rule('/p/<name>/<int:id>')
+    router.add(rule1)
+    router.add(rule2)
+    assert rule1.params['id'].match_segment is str.isdecimal
+    assert rule1.convert('abc', '12') == {'title': 'abc', 'id': 12}
+    environ['PATH_INFO'] = '/p/abc/12'
+    assert router.match(environ) == (rule1, {'title': 'abc', 'id': 12})
+    environ['PATH_INFO'] = '/p/ABC/12'
+    assert router.match(environ) == (rule2, {'name': 'ABC', 'id': 12})
+    with pytest.raises(HTTP404):
+        environ['PATH_INFO'] = '/p/abc/1a'
+        router.match(environ)
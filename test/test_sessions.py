@@ -0,0 +1,500 @@
+import contextvars
+import datetime
+import os
+import socketserver
+import threading
+import time
+import uuid
+from wsgiref.util import setup_testing_defaults
+
+import pytest
+
+from glass import GlassApp, StreamingResponse, flash, request, session, stream_template
+from glass.sessions import decode_session, encode_session, serializer
+
+app = GlassApp()
+app.config['SECRET_KEY'] = 'secret'
+
+
+@app.route('/login')
+def login():
+    session['user'] = 'glass'
+    return 'login'
+
+
+@app.route('/user')
+def user():
+    return session.get('user') or ''
+
+
+@app.route('/cart')
+def cart():
+    session['cart'] = []
+    return 'cart'
+
+
+@app.route('/cart/add')
+def cart_add():
+    session['cart'].append(request.args.get('item'))
+    if request.args.get('modified'):
+        session.modified = True
+    return 'added'
+
+
+@app.route('/cart/show')
+def cart_show():
+    return ','.join(session['cart'])
+
+
+@app.route('/stream')
+def stream():
+    def body():
+        yield session.get('user') or ''
+        session['user'] = 'other'
+        yield 'never'
+
+    return StreamingResponse(body())
+
+
+@app.route('/flash')
+def flash_message():
+    flash('saved')
+    return 'flashed'
+
+
+@app.route('/page')
+def page():
+    return StreamingResponse(stream_template('page.html'))
+
+
+def call(path, cookie=None):
+    path, _, query = path.partition('?')
+    environ = {'PATH_INFO': path, 'QUERY_STRING': query}
+    if cookie:
+        environ['HTTP_COOKIE'] = 'session=' + cookie
+    setup_testing_defaults(environ)
+    result = {}
+
+    def start_response(status, headers):
+        result['cookies'] = [
+            value for name, value in headers if name == 'Set-Cookie'
+        ]
+
+    body = b''.join(contextvars.Context().run(app, environ, start_response))
+    cookies = result['cookies']
+    cookie = cookies[0].split(';')[0].split('=', 1)[1] if cookies else None
+    return body, cookie
+
+
+def test_tagged_json():
+    data = {
+        'user': {'id': uuid.UUID(int=5), 'roles': ('admin', 'staff')},
+        'seen': {1, 2},
+        'at': datetime.datetime(2020, 1, 2, 3, 4, 5),
+        'day': datetime.date(2020, 1, 2),
+        'raw': b'\x00\xff',
+        'escaped': {' t': [1, 2]},
+        '__flash__': ['hello'],
+    }
+    assert serializer.loads(serializer.dumps(data)) == data
+    with pytest.raises(TypeError):
+        serializer.dumps({'x': object()})
+
+
+def test_signed_cookie():
+    with app.mount():
+        cookie = encode_session({'name': 'glass'}, 'secret')
+        assert decode_session(cookie, 'secret') == {'name': 'glass'}
+        assert decode_session(cookie, 'other') is None
+        value, signature = cookie.rsplit('.', 1)
+        assert decode_session(value.replace('j', 'z', 1) + '.' + signature, 'secret') is None
+        assert decode_session('garbage', 'secret') is None
+
+        big = {'items': ['item %d' % (i % 10) for i in range(200)]}
+        cookie = encode_session(big, 'secret')
+        assert cookie.startswith('z')
+        assert len(cookie) < len(serializer.dumps(big))
+        assert decode_session(cookie, 'secret') == big
+
+
+def test_cookie_max_age(monkeypatch):
+    with app.mount():
+        cookie = encode_session({'name': 'glass'}, 'secret')
+    assert decode_session(cookie, 'secret', max_age=60) == {'name': 'glass'}
+    now = time.time()
+    monkeypatch.setattr(time, 'time', lambda: now + 120)
+    assert decode_session(cookie, 'secret', max_age=60) is None
+
+
+def test_unchanged_session_not_sent(monkeypatch):
+    app.config['SESSION_COOKIE_MAXAGE'] = 100
+    body, cookie = call('/login')
+    assert cookie
+    body, new_cookie = call('/user', cookie)
+    assert body == b'glass'
+    assert new_cookie is None
+
+    now = time.time()
+    # refreshed after half of the max age
+    monkeypatch.setattr(time, 'time', lambda: now + 40)
+    assert call('/user', cookie)[1] is None
+    monkeypatch.setattr(time, 'time', lambda: now + 60)
+    body, new_cookie = call('/user', cookie)
+    assert body == b'glass'
+    assert new_cookie and new_cookie != cookie
+    assert call('/user', new_cookie)[0] == b'glass'
+    # expired
+    monkeypatch.setattr(time, 'time', lambda: now + 101)
+    assert call('/user', cookie)[0] == b''
+
+
+def test_nested_change_needs_modified():
+    cookie = call('/cart')[1]
+    # changed in place, not saved
+    assert call('/cart/add?item=a', cookie)[1] is None
+    assert call('/cart/show', cookie)[0] == b''
+    body, cookie = call('/cart/add?item=b&modified=1', cookie)
+    assert cookie
+    assert call('/cart/show', cookie)[0] == b'b'
+
+
+class FakeRedis:
+    def __init__(self):
+        self.data = {}
+        self.calls = []
+
+    def get(self, key):
+        self.calls.append('get')
+        return self.data.get(key, (None,))[0]
+
+    def set(self, key, value, ex=None):
+        self.calls.append('set')
+        self.data[key] = (value, ex)
+
+    def expire(self, key, seconds):
+        self.calls.append('expire')
+        self.data[key] = (self.data[key][0], seconds)
+
+    def delete(self, key):
+        self.calls.append('delete')
+        self.data.pop(key, None)
+
+
+class FakeRedisServer(socketserver.ThreadingTCPServer):
+    """Redis protocol (RESP) server on localhost, enough
+    commands for the session manager.
+    """
+
+    daemon_threads = True
+
+    def __init__(self):
+        super().__init__(('127.0.0.1', 0), FakeRedisHandler)
+        self.data = {}
+        self.commands = []
+        self.connections = 0
+
+    def execute(self, command, *args):
+        """Returns the reply, ``None`` for null reply"""
+        self.commands.append(command)
+        if command in ('SELECT', 'CLIENT'):
+            return b'+OK\r\n'
+        if command == 'HELLO':
+            # RESP3 handshake of redis-py >= 8
+            return (
+                b'%2\r\n$6\r\nserver\r\n$5\r\nredis\r\n'
+                b'$5\r\nproto\r\n:3\r\n'
+            )
+        if command == 'PING':
+            return b'+PONG\r\n'
+        if command == 'GET':
+            value = self.data.get(args[0], (None,))[0]
+            if value is None:
+                return None
+            return b'$%d\r\n%s\r\n' % (len(value), value)
+        if command == 'SET':
+            ex = int(args[3]) if len(args) > 3 and args[2].upper() == b'EX' else None
+            self.data[args[0]] = (args[1], ex)
+            return b'+OK\r\n'
+        if command == 'EXPIRE':
+            if args[0] not in self.data:
+                return b':0\r\n'
+            self.data[args[0]] = (self.data[args[0]][0], int(args[1]))
+            return b':1\r\n'
+        if command == 'DEL':
+            return b':%d\r\n' % sum(self.data.pop(key, None) is not None for key in args)
+        return b'-ERR unknown command\r\n'
+
+
+class FakeRedisHandler(socketserver.StreamRequestHandler):
+    def handle(self):
+        self.server.connections += 1
+        resp3 = False
+        while True:
+            line = self.rfile.readline()
+            if not line:
+                return
+            args = []
+            for _ in range(int(line[1:])):
+                size = int(self.rfile.readline()[1:])
+                args.append(self.rfile.read(size + 2)[:-2])
+            command = args[0].decode().upper()
+            if command == 'HELLO':
+                resp3 = args[1:2] == [b'3']
+            reply = self.server.execute(command, *args[1:])
+            if reply is None:
+                reply = b'_\r\n' if resp3 else b'$-1\r\n'
+            self.wfile.write(reply)
+
+
+def test_redis_session_server(monkeypatch):
+    pytest.importorskip('redis')
+    from glass.sessions import RedisSessionManager
+
+    server = FakeRedisServer()
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    try:
+        manager = RedisSessionManager(
+            host='127.0.0.1', port=server.server_address[1], max_connections=2
+        )
+        assert manager._redis.connection_pool.max_connections == 2
+        app.config['SESSION_COOKIE_MAXAGE'] = 100
+        monkeypatch.setattr(app, 'session_cls', manager)
+        body, cookie = call('/login')
+        sid = cookie.split('.')[0]
+        assert server.data[sid.encode()][1] == 100
+        for _ in range(3):
+            assert call('/user', cookie) == (b'glass', None)
+        assert server.commands.count('GET') == 3
+        # connection taken from the pool, not one per request
+        assert server.connections == 1
+        manager.delete(sid)
+        assert call('/user', cookie)[0] == b''
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+def test_redis_session(monkeypatch):
+    from glass.sessions import RedisSessionManager
+
+    client = FakeRedis()
+    app.config['SESSION_COOKIE_MAXAGE'] = 100
+    monkeypatch.setattr(
+        app, 'session_cls', RedisSessionManager(client=client, prefix='s:', cache_ttl=5)
+    )
+    body, cookie = call('/login')
+    sid = cookie.split('.')[0]
+    assert client.data['s:' + sid][1] == 100
+    assert client.calls == ['set']
+    # read from the local cache, no cookie sent
+    assert call('/user', cookie) == (b'glass', None)
+    assert client.calls == ['set']
+
+    app.session_cls._cache.clear()
+    assert call('/user', cookie) == (b'glass', None)
+    assert client.calls == ['set', 'get']
+
+    now = time.time()
+    monkeypatch.setattr(time, 'time', lambda: now + 60)
+    body, new_cookie = call('/user', cookie)
+    assert new_cookie.split('.')[0] == sid
+    assert client.calls == ['set', 'get', 'expire']
+
+    # unknown session id is not reused
+    body, cookie = call('/login', 'unknown.0')
+    assert not cookie.startswith('unknown')
+
+
+def test_memory_session(monkeypatch):
+    from glass.sessions import MemorySessionManager
+
+    manager = MemorySessionManager(maxsize=2)
+    monkeypatch.setattr(app, 'session_cls', manager)
+    body, cookie = call('/login')
+    assert call('/user', cookie) == (b'glass', None)
+    # least recently used session is evicted
+    other = call('/login')[1]
+    call('/user', cookie)
+    call('/login')
+    assert len(manager) == 2
+    assert call('/user', cookie)[0] == b'glass'
+    assert call('/user', other)[0] == b''
+    # expired
+    sid = cookie.split('.')[0]
+    manager.store(sid, manager.load(sid), -1)
+    assert call('/user', cookie)[0] == b''
+    assert sid not in manager._sessions
+
+
+def test_shared_memory_session(monkeypatch, tmp_path):
+    from glass.sessions import SharedMemorySessionManager
+
+    path = str(tmp_path / 'sessions')
+    manager = SharedMemorySessionManager(path, slots=64, slot_size=256)
+    monkeypatch.setattr(app, 'session_cls', manager)
+    body, cookie = call('/login')
+    assert call('/user', cookie) == (b'glass', None)
+    sid = cookie.split('.')[0]
+    # another process opening the file sees the session
+    other = SharedMemorySessionManager(path, slots=64, slot_size=256)
+    assert other.load(sid) == manager.load(sid)
+    other.delete(sid)
+    assert call('/user', cookie)[0] == b''
+
+    with pytest.raises(ValueError):
+        manager.store('big', b'x' * 256, 10)
+    # full probe window, least recently used is evicted
+    manager = SharedMemorySessionManager(path + '2', slots=2, slot_size=64)
+    manager.probe = 2
+    manager.store('a', b'1', 10)
+    manager.store('b', b'2', 10)
+    manager.load('a')
+    manager.store('c', b'3', 10)
+    assert manager.load('a') == b'1'
+    assert manager.load('b') is None
+    assert manager.load('c') == b'3'
+
+
+def test_sqlite_session(monkeypatch, tmp_path):
+    from glass.sessions import SQLiteSessionManager
+
+    path = str(tmp_path / 'sessions.db')
+    manager = SQLiteSessionManager(path, flush_interval=60)
+    monkeypatch.setattr(app, 'session_cls', manager)
+    body, cookie = call('/login')
+    sid = cookie.split('.')[0]
+    # queued, read before it is written
+    assert sid in manager._pending
+    assert call('/user', cookie) == (b'glass', None)
+    manager.flush()
+    assert not manager._pending
+
+    # survives restart
+    restarted = SQLiteSessionManager(path)
+    assert restarted.load(sid) == manager.load(sid)
+    monkeypatch.setattr(app, 'session_cls', restarted)
+    assert call('/user', cookie) == (b'glass', None)
+
+    manager.store('old', b'{}', -1)
+    manager.store('new', b'{}', 10)
+    manager.touch(sid, 1000)
+    manager.flush()
+    assert manager.load('old') is None
+    manager.sweep_chunk = 1
+    assert manager.sweep() == 1
+    count = manager.connection.execute('SELECT count(*) FROM sessions').fetchone()
+    assert count == (2,)
+
+    manager.delete(sid)
+    assert manager.load(sid) is None
+    manager.close()
+    assert restarted.load(sid) is None
+
+
+def test_sqlite_session_background_flush(tmp_path):
+    from glass.sessions import SQLiteSessionManager
+
+    manager = SQLiteSessionManager(str(tmp_path / 'sessions.db'), flush_interval=0.01)
+    manager.store('sid', b'data', 10)
+    for _ in range(100):
+        row = manager.connection.execute('SELECT data FROM sessions').fetchone()
+        if row:
+            break
+        time.sleep(0.01)
+    assert row == (b'data',)
+    manager.close()
+
+
+def test_session_read_only_in_stream():
+    cookie = call('/login')[1]
+    environ = {'PATH_INFO': '/stream', 'HTTP_COOKIE': 'session=' + cookie}
+    setup_testing_defaults(environ)
+    iterator = iter(contextvars.Context().run(app, environ, lambda *args: None))
+    assert next(iterator) == b'glass'
+    with pytest.raises(RuntimeError):
+        next(iterator)
+
+
+@pytest.mark.skipif(not hasattr(os, 'fork'), reason='requires fork')
+def test_sqlite_session_fork(tmp_path):
+    from glass.sessions import SQLiteSessionManager
+
+    manager = SQLiteSessionManager(str(tmp_path / 'sessions.db'), flush_interval=60)
+    parent_connection = manager.connection
+    manager.store('parent', b'data', 10)
+    read, write = os.pipe()
+    pid = os.fork()
+    if pid == 0:
+        # worker process
+        ok = (
+            manager.connection is not parent_connection
+            and not manager._pending
+            and manager.load('parent') is None
+        )
+        os.write(write, b'1' if ok else b'0')
+        os._exit(0)
+    os.waitpid(pid, 0)
+    assert os.read(read, 1) == b'1'
+    assert manager.connection is parent_connection
+    assert manager.load('parent') == b'data'
+    manager.close()
+
+
+def test_sqlite_session_read_during_flush(tmp_path):
+    import threading
+
+    from glass.sessions import SQLiteSessionManager
+
+    started = threading.Event()
+    release = threading.Event()
+
+    class SlowConnection:
+        def __init__(self, connection):
+            self.connection = connection
+
+        def __enter__(self):
+            self.connection.__enter__()
+            return self
+
+        def __exit__(self, *args):
+            return self.connection.__exit__(*args)
+
+        def executemany(self, sql, rows):
+            started.set()
+            release.wait(5)
+            return self.connection.executemany(sql, rows)
+
+    class SlowManager(SQLiteSessionManager):
+        @property
+        def connection(self):
+            connection = SQLiteSessionManager.connection.fget(self)
+            if threading.current_thread() is flusher:
+                return SlowConnection(connection)
+            return connection
+
+    manager = SlowManager(str(tmp_path / 'sessions.db'), flush_interval=60)
+    manager.store('sid', b'data', 10)
+    flusher = threading.Thread(target=manager.flush)
+    flusher.start()
+    assert started.wait(5)
+    # written, not committed yet
+    assert not manager._pending
+    assert manager.load('sid') == b'data'
+    release.set()
+    flusher.join()
+    assert not manager._flushing
+    assert manager.load('sid') == b'data'
+    manager.close()
+
+
+def test_flash_messages_in_streamed_template(monkeypatch, tmp_path):
+    (tmp_path / 'page.html').write_text(
+        '<p>{% for message in get_flash_messages %}{{message}}{% endfor %}</p>'
+    )
+    monkeypatch.setitem(app.config, 'TEMPLATES_FOLDER', str(tmp_path))
+    cookie = call('/flash')[1]
+    body, new_cookie = call('/page', cookie)
+    assert body == b'<p>saved</p>'
+    # saved without the messages, the empty session cookie is deleted
+    assert new_cookie == ''
+    assert call('/page') == (b'<p></p>', None)
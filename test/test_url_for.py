@@ -230,3 +230,30 @@ def test_url_for_in_tags():
     funcs = node.view_kwargs['_target'].funcs
     funcs = list(dict(funcs))
     assert funcs == ['upper', 'url']
+
+
+def test_rule_builder():
+    rule = app.view_func['do_reset_3']
+    assert rule.build(id=1) == '/reset/1/test/'
+    assert rule.build(id='a\\1') == '/reset/a\\1/test/'
+    app.config['SERVER_NAME'] = 'https://blog.Horlarwumhe.me'
+    with app.mount():
+        assert url_for('login') == 'https://blog.Horlarwumhe.me/u/login'
+        app.config['SERVER_NAME'] = 'glass.Horlarwumhe.me'
+        assert url_for('login') == 'http://glass.Horlarwumhe.me/u/login'
+
+
+@app.route('/dashboard', host='<tenant>.glass.me')
+def dashboard(tenant):
+    return tenant
+
+
+def test_url_for_host():
+    app.config['SERVER_NAME'] = ''
+    with app.mount():
+        path = url_for('dashboard', tenant='blog', q='1')
+        assert path == 'http://blog.glass.me/dashboard?q=1'
+        path = url_for('dashboard', tenant='blog', _scheme='https')
+        assert path == 'https://blog.glass.me/dashboard'
+        with pytest.raises(TypeError):
+            url_for('dashboard')